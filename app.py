@@ -4,7 +4,6 @@ Pure Flask web application for ceramic tile quality management
 """
 
 from flask import Flask, render_template, session, redirect, url_for
-from data.database import DatabaseManager
 import os
 import logging
 
@@ -26,9 +25,9 @@ def create_app():
     app = Flask(__name__)
     app.secret_key = 'dersa_ecoquality_secret_key_2025'
     
-    # Initialize database
+    # Initialize database (shared with the blueprints)
     try:
-        db = DatabaseManager()
+        from data.db import db
         db.seed_initial_data()
         logger.info("Database initialized successfully")
     except Exception as e:
@@ -45,29 +44,12 @@ def create_app():
     app.register_blueprint(raw_materials_bp)
     
     # Template filters for better display
-    @app.template_filter('format_date')
-    def format_date_filter(date_obj):
-        """Format date for templates"""
-        from utils.helpers import format_date
-        return format_date(date_obj)
-    
-    @app.template_filter('format_datetime')
-    def format_datetime_filter(datetime_obj):
-        """Format datetime for templates"""
-        from utils.helpers import format_datetime
-        return format_datetime(datetime_obj)
-    
-    @app.template_filter('status_badge')
-    def status_badge_filter(status):
-        """Get CSS class for status badges"""
-        from utils.helpers import get_status_badge_class
-        return get_status_badge_class(status)
-    
-    @app.template_filter('priority_badge')
-    def priority_badge_filter(priority):
-        """Get CSS class for priority badges"""
-        from utils.helpers import get_priority_badge_class
-        return get_priority_badge_class(priority)
+    # Helpers are registered directly to skip a wrapper call per table cell
+    from utils.helpers import format_date, format_datetime, get_status_badge_class, get_priority_badge_class
+    app.add_template_filter(format_date, 'format_date')
+    app.add_template_filter(format_datetime, 'format_datetime')
+    app.add_template_filter(get_status_badge_class, 'status_badge')
+    app.add_template_filter(get_priority_badge_class, 'priority_badge')
     
     # Error handlers
     @app.errorhandler(404)
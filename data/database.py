@@ -6,18 +6,36 @@ Local SQLite database for ceramic tile quality management
 import sqlite3
 import os
 import bcrypt
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Tuple
 from contextlib import contextmanager
+from functools import lru_cache
 import logging
 from datetime import datetime, date
+from utils.cache import invalidate_user_names
 
 logger = logging.getLogger(__name__)
 
+# Bulk loads at least this large drop secondary indexes and rebuild them afterwards
+INDEX_REBUILD_THRESHOLD = 100
+# Rows per executemany() call in bulk_insert; bounds the parameter list built at once
+BULK_BATCH_SIZE = 500
+# INSERT texts kept per (table, columns) shape; routes drop empty fields, so shapes vary
+INSERT_STATEMENT_CACHE_SIZE = 128
+
+@lru_cache(maxsize=INSERT_STATEMENT_CACHE_SIZE)
+def _insert_sql(table: str, columns: Tuple[str, ...]) -> str:
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+
 class DatabaseManager:
     def __init__(self, db_path: str = "data/dersa_ecoquality.db"):
         self.db_path = db_path
+        # Marker file written once the initial data is in place
+        self.seed_marker_path = db_path + '.seeded'
         # Ensure data directory exists
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        if not os.path.exists(db_path) and os.path.exists(self.seed_marker_path):
+            # Marker left over from a deleted database
+            os.remove(self.seed_marker_path)
         self.init_database()
 
     @contextmanager
@@ -26,6 +44,8 @@ class DatabaseManager:
         try:
             conn = sqlite3.connect(self.db_path)
             conn.row_factory = sqlite3.Row  # Enable dict-like access
+            # Safe with WAL: a crash can lose the last commits but not corrupt the file
+            conn.execute("PRAGMA synchronous=NORMAL")
             yield conn
         except Exception as e:
             if conn:
@@ -40,6 +60,8 @@ class DatabaseManager:
         """Initialize SQLite database with all required tables"""
         with self.get_connection() as conn:
             cur = conn.cursor()
+            # Persistent setting: commits append to the WAL instead of rewriting pages
+            cur.execute("PRAGMA journal_mode=WAL")
             
             # Users and Authentication
             cur.execute("""
@@ -208,7 +230,24 @@ class DatabaseManager:
 
             # Create indexes for better performance
             cur.execute("CREATE INDEX IF NOT EXISTS idx_production_batches_date ON production_batches(production_date)")
+            # A standard parameter is identified without its limits, so reseeding with
+            # new limits updates it; keep the newest of any duplicates before enforcing it
+            cur.execute("""
+                DELETE FROM iso_standards WHERE id NOT IN (
+                    SELECT MAX(id) FROM iso_standards
+                    GROUP BY standard_code, parameter_name, applicable_product_types
+                )
+            """)
+            cur.execute("""
+                CREATE UNIQUE INDEX IF NOT EXISTS ux_iso_std_key
+                ON iso_standards(standard_code, parameter_name, applicable_product_types)
+            """)
             cur.execute("CREATE INDEX IF NOT EXISTS idx_quality_tests_batch ON quality_tests(batch_id)")
+            # Covers the dashboard's recent tests list so it never touches the table rows
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_quality_tests_dashboard
+                ON quality_tests(test_date DESC, batch_id, pass_fail, iso_compliant, test_type)
+            """)
             cur.execute("CREATE INDEX IF NOT EXISTS idx_energy_consumption_date ON energy_consumption(recorded_date)")
             cur.execute("CREATE INDEX IF NOT EXISTS idx_waste_records_date ON waste_records(recorded_date)")
 
@@ -219,13 +258,17 @@ class DatabaseManager:
         """Execute a query and return results"""
         with self.get_connection() as conn:
             cur = conn.cursor()
+            # Plain tuples: column names are resolved once per query instead of per row
+            cur.row_factory = None
             if params:
                 cur.execute(query, params)
             else:
                 cur.execute(query)
-            
-            rows = cur.fetchall()
-            return [{column: row[column] for column in row.keys()} for row in rows]
+
+            if cur.description is None:
+                return []
+            columns = [col[0] for col in cur.description]
+            return [dict(zip(columns, row)) for row in cur.fetchall()]
 
     def execute_single(self, query: str, params: tuple = None) -> Optional[Dict[str, Any]]:
         """Execute a query and return single result"""
@@ -241,14 +284,10 @@ class DatabaseManager:
 
     def insert_record(self, table: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Insert a record and return the created record"""
-        columns = list(data.keys())
-        placeholders = ['?' for _ in columns]
+        columns = tuple(data)
         values = [data[col] for col in columns]
         
-        query = f"""
-            INSERT INTO {table} ({', '.join(columns)})
-            VALUES ({', '.join(placeholders)})
-        """
+        query = _insert_sql(table, columns)
         
         with self.get_connection() as conn:
             cur = conn.cursor()
@@ -259,6 +298,67 @@ class DatabaseManager:
             row_id = cur.lastrowid
             return self.execute_single(f"SELECT * FROM {table} WHERE id = ?", (row_id,))
 
+    def bulk_insert(self, table: str, rows: List[Dict[str, Any]], skip_existing: bool = False,
+                    upsert_on: Optional[Tuple[str, ...]] = None) -> int:
+        """
+        Insert rows sharing the same keys with one prepared statement and one
+        commit, BULK_BATCH_SIZE rows per executemany() call
+        With skip_existing, rows that collide with a unique index are left out;
+        with upsert_on, rows matching an existing one on those columns update it
+        Returns the number of rows inserted or updated
+        """
+        if not rows:
+            return 0
+        columns = tuple(rows[0])
+        query = _insert_sql(table, columns)
+        if upsert_on:
+            updates = [f"{col} = excluded.{col}" for col in columns if col not in upsert_on]
+            query += f" ON CONFLICT({', '.join(upsert_on)}) DO UPDATE SET {', '.join(updates)}"
+        elif skip_existing:
+            query = query.replace('INSERT', 'INSERT OR IGNORE', 1)
+        
+        with self.get_connection() as conn:
+            # sqlite3 only opens its implicit transaction at the first INSERT; begin
+            # here so a failed load also rolls back the index drops below
+            conn.execute("BEGIN")
+            # Large loads: one index build per index instead of an index update per row.
+            # Unique indexes stay in place since skip_existing relies on them
+            indexes = []
+            if len(rows) >= INDEX_REBUILD_THRESHOLD:
+                indexes = conn.execute("""
+                    SELECT name, sql FROM sqlite_master
+                    WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL
+                      AND sql NOT LIKE 'CREATE UNIQUE%'
+                """, (table,)).fetchall()
+                for name, _ in indexes:
+                    conn.execute(f"DROP INDEX {name}")
+            inserted = 0
+            for start in range(0, len(rows), BULK_BATCH_SIZE):
+                batch = rows[start:start + BULK_BATCH_SIZE]
+                inserted += conn.executemany(query, [tuple(row[col] for col in columns) for row in batch]).rowcount
+            for _, sql in indexes:
+                conn.execute(sql)
+            conn.commit()
+        return inserted
+
+    def insert_record_if_absent(self, table: str, data: Dict[str, Any], unique_column: str) -> Optional[Dict[str, Any]]:
+        """
+        Insert a record unless one with the same unique_column value exists
+        Returns the created record, or None if the value was already taken
+        """
+        columns = tuple(data)
+        values = [data[col] for col in columns]
+
+        # Single statement: the UNIQUE index decides atomically, no SELECT beforehand
+        query = _insert_sql(table, columns) + f" ON CONFLICT({unique_column}) DO NOTHING RETURNING *"
+
+        with self.get_connection() as conn:
+            cur = conn.cursor()
+            cur.execute(query, values)
+            row = cur.fetchone()
+            conn.commit()
+            return {column: row[column] for column in row.keys()} if row else None
+
     def hash_password(self, password: str) -> str:
         """Hash password using bcrypt"""
         return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -269,6 +369,10 @@ class DatabaseManager:
 
     def seed_initial_data(self):
         """Seed the database with initial data"""
+        # Already seeded: skip the admin and ISO seed queries on later startups
+        if os.path.exists(self.seed_marker_path):
+            return
+        
         # Check if admin user exists
         admin_exists = self.execute_single("SELECT id FROM users WHERE username = 'admin'")
         
@@ -283,8 +387,6 @@ class DatabaseManager:
                 'department': 'Management',
                 'is_active': 1
             }
-            self.insert_record('users', admin_data)
-            logger.info("Admin user created")
             
             # Create quality technician user
             tech_data = {
@@ -296,47 +398,48 @@ class DatabaseManager:
                 'department': 'Quality Control',
                 'is_active': 1
             }
-            self.insert_record('users', tech_data)
-            logger.info("Quality technician user created")
+            self.bulk_insert('users', [admin_data, tech_data])
+            invalidate_user_names(self)
+            logger.info("Admin and quality technician users created")
 
-        # Check if ISO standards exist
-        iso_exists = self.execute_single("SELECT id FROM iso_standards LIMIT 1")
-        if not iso_exists:
-            # Add basic ISO standards
-            iso_standards = [
-                {
-                    'standard_code': 'ISO 13006',
-                    'standard_name': 'Ceramic tiles - Definitions, classification, characteristics and marking',
-                    'parameter_name': 'length_mm',
-                    'min_value': 195.0,
-                    'max_value': 205.0,
-                    'unit': 'mm',
-                    'test_method': 'Direct measurement with calibrated ruler',
-                    'applicable_product_types': 'All ceramic tiles'
-                },
-                {
-                    'standard_code': 'ISO 13006',
-                    'standard_name': 'Ceramic tiles - Definitions, classification, characteristics and marking',
-                    'parameter_name': 'water_absorption_percentage',
-                    'min_value': 0.0,
-                    'max_value': 3.0,
-                    'unit': '%',
-                    'test_method': 'Water absorption test according to ISO 10545-3',
-                    'applicable_product_types': 'Porcelain tiles'
-                },
-                {
-                    'standard_code': 'ISO 10545-4',
-                    'standard_name': 'Ceramic tiles - Test methods - Determination of modulus of rupture and breaking strength',
-                    'parameter_name': 'breaking_strength_n',
-                    'min_value': 1300.0,
-                    'max_value': None,
-                    'unit': 'N',
-                    'test_method': 'Three-point bending test',
-                    'applicable_product_types': 'All ceramic tiles'
-                }
-            ]
-            
-            for standard in iso_standards:
-                self.insert_record('iso_standards', standard)
-            
-            logger.info("ISO standards seeded")
\ No newline at end of file
+        # Add basic ISO standards
+        iso_standards = [
+            {
+                'standard_code': 'ISO 13006',
+                'standard_name': 'Ceramic tiles - Definitions, classification, characteristics and marking',
+                'parameter_name': 'length_mm',
+                'min_value': 195.0,
+                'max_value': 205.0,
+                'unit': 'mm',
+                'test_method': 'Direct measurement with calibrated ruler',
+                'applicable_product_types': 'All ceramic tiles'
+            },
+            {
+                'standard_code': 'ISO 13006',
+                'standard_name': 'Ceramic tiles - Definitions, classification, characteristics and marking',
+                'parameter_name': 'water_absorption_percentage',
+                'min_value': 0.0,
+                'max_value': 3.0,
+                'unit': '%',
+                'test_method': 'Water absorption test according to ISO 10545-3',
+                'applicable_product_types': 'Porcelain tiles'
+            },
+            {
+                'standard_code': 'ISO 10545-4',
+                'standard_name': 'Ceramic tiles - Test methods - Determination of modulus of rupture and breaking strength',
+                'parameter_name': 'breaking_strength_n',
+                'min_value': 1300.0,
+                'max_value': None,
+                'unit': 'N',
+                'test_method': 'Three-point bending test',
+                'applicable_product_types': 'All ceramic tiles'
+            }
+        ]
+        
+        # Standards already present get these limits via ux_iso_std_key
+        seeded = self.bulk_insert('iso_standards', iso_standards,
+                                  upsert_on=('standard_code', 'parameter_name', 'applicable_product_types'))
+        
+        logger.info(f"ISO standards seeded ({seeded} rows)")
+    
+        open(self.seed_marker_path, 'w').close()
@@ -0,0 +1,8 @@
+"""
+Dersa EcoQuality - Shared Database Instance
+Single DatabaseManager used by the application factory and all blueprints
+"""
+
+from data.database import DatabaseManager
+
+db = DatabaseManager()
@@ -4,16 +4,43 @@ Comprehensive quality management system for ceramic tile manufacturing
 """
 
 import os
+import threading
 import psycopg2
 import psycopg2.extras
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Sequence, Tuple
 from contextlib import contextmanager
+from functools import lru_cache
 import logging
 from datetime import datetime, date, time
 from enum import Enum
 
 logger = logging.getLogger(__name__)
 
+# Rows per multi-row INSERT statement; PostgreSQL throughput levels off around 1000
+VALUES_PAGE_SIZE = 1000
+# INSERT ... RETURNING texts kept per (table, columns) shape; callers omit empty fields
+INSERT_STATEMENT_CACHE_SIZE = 128
+
+# Derived percentages computed by PostgreSQL (12+) on every insert and update
+ENERGY_EFFICIENCY_EXPR = "ROUND(target_consumption / NULLIF(consumption_kwh, 0) * 100, 2)"
+THERMAL_EFFICIENCY_EXPR = (
+    "CASE WHEN input_temperature > 0 "
+    "THEN ROUND((input_temperature - output_temperature) / input_temperature * 100, 2) END"
+)
+GENERATED_EFFICIENCY_COLUMNS = (
+    ('energy_consumption', 'efficiency_percentage', ENERGY_EFFICIENCY_EXPR),
+    ('heat_recovery', 'thermal_efficiency_percentage', THERMAL_EFFICIENCY_EXPR)
+)
+
+@lru_cache(maxsize=INSERT_STATEMENT_CACHE_SIZE)
+def _insert_returning_sql(table: str, columns: Tuple[str, ...]) -> str:
+    placeholders = [f"%({col})s" for col in columns]
+    return f"""
+        INSERT INTO {table} ({', '.join(columns)})
+        VALUES ({', '.join(placeholders)})
+        RETURNING *
+    """
+
 class UserRole(Enum):
     ADMIN = "admin"
     QUALITY_TECHNICIAN = "quality_technician"
@@ -66,10 +93,17 @@ class DatabaseManager:
         self.db_url = os.getenv('DATABASE_URL')
         if not self.db_url:
             raise ValueError("DATABASE_URL environment variable is required")
+        # Connection of the transaction() block open on the current thread, if any
+        self._local = threading.local()
         self.init_database()
 
     @contextmanager
     def get_connection(self):
+        # Statements issued inside transaction() run on its connection
+        shared = getattr(self._local, 'conn', None)
+        if shared is not None:
+            yield shared
+            return
         conn = None
         try:
             conn = psycopg2.connect(self.db_url)
@@ -84,6 +118,46 @@ class DatabaseManager:
             if conn:
                 conn.close()
 
+    @contextmanager
+    def transaction(self):
+        """
+        Run every statement issued in the block on one connection and commit
+        once at the end, rolling back if the block raises
+        Nested calls join the outer transaction
+        """
+        shared = getattr(self._local, 'conn', None)
+        if shared is not None:
+            yield shared
+            return
+        conn = psycopg2.connect(self.db_url)
+        self._local.conn = conn
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor = getattr(self._local, 'cursor', None)
+            if cursor is not None:
+                cursor.close()
+                self._local.cursor = None
+            self._local.conn = None
+            conn.close()
+
+    @contextmanager
+    def cursor(self):
+        """
+        Yield a plain cursor inside transaction(); every statement of the
+        same transaction reuses it instead of allocating its own
+        """
+        with self.transaction() as conn:
+            cursor = getattr(self._local, 'cursor', None)
+            if cursor is None:
+                cursor = conn.cursor()
+                self._local.cursor = cursor
+            yield cursor
+
     def init_database(self):
         """Initialize database with all required tables"""
         with self.get_connection() as conn:
@@ -211,7 +285,7 @@ class DatabaseManager:
                 """)
 
                 # Energy Consumption
-                cur.execute("""
+                cur.execute(f"""
                     CREATE TABLE IF NOT EXISTS energy_consumption (
                         id SERIAL PRIMARY KEY,
                         recorded_date DATE DEFAULT CURRENT_DATE,
@@ -222,7 +296,7 @@ class DatabaseManager:
                         consumption_kwh DECIMAL(10,3) NOT NULL,
                         cost_amount DECIMAL(10,2),
                         meter_reading DECIMAL(12,3),
-                        efficiency_percentage DECIMAL(5,2),
+                        efficiency_percentage DECIMAL(5,2) GENERATED ALWAYS AS ({ENERGY_EFFICIENCY_EXPR}) STORED,
                         target_consumption DECIMAL(10,3),
                         notes TEXT,
                         recorded_by INTEGER REFERENCES users(id),
@@ -231,7 +305,7 @@ class DatabaseManager:
                 """)
 
                 # Heat Recovery System
-                cur.execute("""
+                cur.execute(f"""
                     CREATE TABLE IF NOT EXISTS heat_recovery (
                         id SERIAL PRIMARY KEY,
                         recorded_date DATE DEFAULT CURRENT_DATE,
@@ -239,7 +313,7 @@ class DatabaseManager:
                         input_temperature DECIMAL(6,2),
                         output_temperature DECIMAL(6,2),
                         heat_recovered_kwh DECIMAL(10,3),
-                        thermal_efficiency_percentage DECIMAL(5,2),
+                        thermal_efficiency_percentage DECIMAL(5,2) GENERATED ALWAYS AS ({THERMAL_EFFICIENCY_EXPR}) STORED,
                         energy_savings_kwh DECIMAL(10,3),
                         cost_savings DECIMAL(10,2),
                         equipment_status VARCHAR(50),
@@ -249,6 +323,21 @@ class DatabaseManager:
                     )
                 """)
 
+                # Databases created before the efficiency columns were generated
+                # store Python-computed values; recompute them in the database
+                for table, column, expression in GENERATED_EFFICIENCY_COLUMNS:
+                    cur.execute("""
+                        SELECT 1 FROM information_schema.columns
+                        WHERE table_schema = current_schema() AND table_name = %s
+                          AND column_name = %s AND is_generated = 'NEVER'
+                    """, (table, column))
+                    if cur.fetchone():
+                        cur.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+                        cur.execute(f"""
+                            ALTER TABLE {table} ADD COLUMN {column} DECIMAL(5,2)
+                            GENERATED ALWAYS AS ({expression}) STORED
+                        """)
+
                 # Waste Management
                 cur.execute("""
                     CREATE TABLE IF NOT EXISTS waste_records (
@@ -345,12 +434,18 @@ class DatabaseManager:
                     )
                 """)
 
-                # ISO Standards Reference
+                # ISO Standards Reference: one row per standard, one per tested parameter
                 cur.execute("""
-                    CREATE TABLE IF NOT EXISTS iso_standards (
+                    CREATE TABLE IF NOT EXISTS iso_standard (
+                        code VARCHAR(20) PRIMARY KEY, -- ISO 13006, ISO 10545-3, etc.
+                        name VARCHAR(255) NOT NULL
+                    )
+                """)
+
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS iso_parameter (
                         id SERIAL PRIMARY KEY,
-                        standard_code VARCHAR(20) NOT NULL, -- ISO 13006, ISO 10545-3, etc.
-                        standard_name VARCHAR(255) NOT NULL,
+                        code VARCHAR(20) NOT NULL REFERENCES iso_standard(code),
                         parameter_name VARCHAR(100) NOT NULL,
                         min_value DECIMAL(12,4),
                         max_value DECIMAL(12,4),
@@ -362,13 +457,97 @@ class DatabaseManager:
                     )
                 """)
 
+                # Move rows out of the former denormalized iso_standards table
+                cur.execute("""
+                    DO $$ BEGIN
+                        IF EXISTS (SELECT 1 FROM pg_tables WHERE schemaname = current_schema() AND tablename = 'iso_standards') THEN
+                            INSERT INTO iso_standard (code, name)
+                            SELECT DISTINCT ON (standard_code) standard_code, standard_name
+                            FROM iso_standards ORDER BY standard_code, id
+                            ON CONFLICT DO NOTHING;
+                            INSERT INTO iso_parameter (code, parameter_name, min_value, max_value, unit,
+                                                       test_method, applicable_product_types, is_active, created_at)
+                            SELECT standard_code, parameter_name, min_value, max_value, unit,
+                                   test_method, applicable_product_types, is_active, created_at
+                            FROM iso_standards
+                            ON CONFLICT DO NOTHING;
+                            DROP TABLE iso_standards;
+                        END IF;
+                    END $$;
+                """)
+
+                # A parameter is identified by its standard, name and product types, so
+                # reseeding with new limits updates it; keep the newest of any duplicates
+                cur.execute("""
+                    DELETE FROM iso_parameter a USING iso_parameter b
+                    WHERE a.code = b.code AND a.parameter_name = b.parameter_name
+                      AND a.applicable_product_types IS NOT DISTINCT FROM b.applicable_product_types
+                      AND a.id < b.id
+                """)
+                cur.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS ux_iso_parameter_key
+                    ON iso_parameter(code, parameter_name, applicable_product_types)
+                """)
+
+                # Readers keep querying iso_standards with the original columns
+                cur.execute("""
+                    CREATE OR REPLACE VIEW iso_standards AS
+                    SELECT p.id, s.code AS standard_code, s.name AS standard_name, p.parameter_name,
+                           p.min_value, p.max_value, p.unit, p.test_method, p.applicable_product_types,
+                           p.is_active, p.created_at
+                    FROM iso_parameter p
+                    JOIN iso_standard s ON s.code = p.code
+                """)
+
+                # Daily aggregates behind the dashboard trend charts; the unique indexes
+                # allow REFRESH MATERIALIZED VIEW CONCURRENTLY
+                cur.execute("""
+                    CREATE MATERIALIZED VIEW IF NOT EXISTS mv_energy_daily AS
+                    SELECT recorded_date, source, SUM(consumption_kwh) AS value
+                    FROM energy_consumption
+                    GROUP BY recorded_date, source
+                """)
+                cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_energy_daily ON mv_energy_daily(recorded_date, source)")
+                cur.execute("""
+                    CREATE MATERIALIZED VIEW IF NOT EXISTS mv_quality_daily AS
+                    SELECT test_date, AVG(CASE WHEN pass_fail = 'PASS' THEN 1.0 ELSE 0.0 END) * 100 AS value
+                    FROM quality_tests
+                    GROUP BY test_date
+                """)
+                cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_quality_daily ON mv_quality_daily(test_date)")
+                cur.execute("""
+                    CREATE MATERIALIZED VIEW IF NOT EXISTS mv_waste_daily AS
+                    SELECT recorded_date, waste_type, SUM(quantity_kg) AS value
+                    FROM waste_records
+                    GROUP BY recorded_date, waste_type
+                """)
+                cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_mv_waste_daily ON mv_waste_daily(recorded_date, waste_type)")
+
+                # SHA-256 of each seed file as of its last load
+                cur.execute("""
+                    CREATE TABLE IF NOT EXISTS _seed_meta (
+                        name VARCHAR(100) PRIMARY KEY,
+                        sha CHAR(64) NOT NULL
+                    )
+                """)
+
                 # Create indexes for better performance
                 cur.execute("CREATE INDEX IF NOT EXISTS idx_production_batches_date ON production_batches(production_date)")
                 cur.execute("CREATE INDEX IF NOT EXISTS idx_quality_tests_batch ON quality_tests(batch_id)")
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_quality_tests_date ON quality_tests(test_date)")
                 cur.execute("CREATE INDEX IF NOT EXISTS idx_energy_consumption_date ON energy_consumption(recorded_date)")
                 cur.execute("CREATE INDEX IF NOT EXISTS idx_waste_records_date ON waste_records(recorded_date)")
+                cur.execute("CREATE INDEX IF NOT EXISTS idx_heat_recovery_date ON heat_recovery(recorded_date)")
                 cur.execute("CREATE INDEX IF NOT EXISTS idx_alerts_unresolved ON alerts(is_resolved) WHERE is_resolved = false")
 
+                # Seed targets are unique so re-seeding can skip rows already present;
+                # drop duplicates left by earlier seed runs before enforcing it
+                cur.execute("""
+                    DELETE FROM environmental_kpis a USING environmental_kpis b
+                    WHERE a.kpi_name = b.kpi_name AND a.id > b.id
+                """)
+                cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_environmental_kpis_name ON environmental_kpis(kpi_name)")
+
                 logger.info("Database tables created successfully")
 
     def execute_query(self, query: str, params: tuple = None) -> List[Dict[str, Any]]:
@@ -390,13 +569,54 @@ class DatabaseManager:
 
     def insert_record(self, table: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Insert a record and return the created record"""
-        columns = list(data.keys())
-        placeholders = [f"%({col})s" for col in columns]
+        return self.execute_single(_insert_returning_sql(table, tuple(data)), data)
+
+    def insert_records(self, table: str, rows: List[Dict[str, Any]],
+                       page_size: int = VALUES_PAGE_SIZE) -> List[Dict[str, Any]]:
+        """
+        Insert dict rows as multi-row INSERT ... VALUES statements in a single
+        transaction, one statement series per distinct set of keys, so omitted
+        columns keep their defaults
+        Returns the created records in input order
+        """
+        shapes: Dict[Tuple[str, ...], List[int]] = {}
+        for index, row in enumerate(rows):
+            shapes.setdefault(tuple(row), []).append(index)
         
-        query = f"""
-            INSERT INTO {table} ({', '.join(columns)})
-            VALUES ({', '.join(placeholders)})
-            RETURNING *
+        created: List[Optional[Dict[str, Any]]] = [None] * len(rows)
+        with self.cursor() as cur:
+            for columns, indexes in shapes.items():
+                query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s RETURNING *"
+                records = psycopg2.extras.execute_values(
+                    cur, query, [tuple(rows[i][col] for col in columns) for i in indexes],
+                    page_size=page_size, fetch=True
+                )
+                names = [col[0] for col in cur.description]
+                for index, record in zip(indexes, records):
+                    created[index] = dict(zip(names, record))
+        return created
+
+    def multi_values_insert(self, table: str, columns: Sequence[str], rows: Sequence[Sequence[Any]],
+                            page_size: int = VALUES_PAGE_SIZE, skip_existing: bool = False,
+                            upsert_on: Optional[Sequence[str]] = None) -> int:
+        """
+        Insert value tuples (in columns order) as multi-row INSERT ... VALUES
+        (...), (...) statements, page_size rows per statement, all in a
+        single transaction. With skip_existing, rows that collide with a
+        unique index are left out (ON CONFLICT DO NOTHING); with upsert_on,
+        rows matching an existing one on those columns update its other columns
+        Returns the number of rows inserted or updated
         """
+        if not rows:
+            return 0
+        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s"
+        if upsert_on:
+            updates = [f"{col} = EXCLUDED.{col}" for col in columns if col not in upsert_on]
+            query += f" ON CONFLICT ({', '.join(upsert_on)}) DO UPDATE SET {', '.join(updates)}"
+        elif skip_existing:
+            query += " ON CONFLICT DO NOTHING"
+        query += " RETURNING 1"
         
-        return self.execute_single(query, data)
\ No newline at end of file
+        with self.cursor() as cur:
+            inserted = psycopg2.extras.execute_values(cur, query, rows, page_size=page_size, fetch=True)
+        return len(inserted)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Dersa EcoQuality - Trend View Refresh
+Recompute the dashboard trend materialized views; schedule it from cron,
+e.g. */15 * * * * python refresh_trend_views.py
+"""
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+def run_refresh():
+    """Refresh every trend view once"""
+    try:
+        from models import DatabaseManager
+        from services import DashboardService
+        DashboardService(DatabaseManager()).refresh_trend_views()
+        logger.info("Trend views refreshed")
+    except Exception as e:
+        logger.error(f"Trend view refresh failed: {e}")
+        raise
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    run_refresh()
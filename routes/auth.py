@@ -4,14 +4,17 @@ User login, logout, and session management
 """
 
 from flask import Blueprint, request, render_template, redirect, url_for, flash, session
-from data.database import DatabaseManager
+from data.db import db
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 auth_bp = Blueprint('auth', __name__)
 
-db = DatabaseManager()
+def require_login():
+    """before_request hook for blueprints whose pages all need a logged-in user"""
+    if 'user_id' not in session:
+        return redirect(url_for('auth.login'))
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -23,7 +26,10 @@ def login():
             flash('Username and password required', 'error')
             return render_template('login.html')
         
-        user = db.execute_single("SELECT * FROM users WHERE username = ? AND is_active = 1", (username,))
+        user = db.execute_single(
+            "SELECT id, username, role, full_name, password_hash FROM users WHERE username = ? AND is_active = 1",
+            (username,)
+        )
         
         if user and db.verify_password(password, user['password_hash']):
             session['user_id'] = user['id']
@@ -4,48 +4,43 @@ Energy consumption tracking and efficiency monitoring
 """
 
 from flask import Blueprint, request, render_template, redirect, url_for, flash, session
-from data.database import DatabaseManager
-from utils.helpers import validate_required_fields, safe_float_convert
-from datetime import datetime, date
+from data.db import db
+from routes.auth import require_login
+from utils.helpers import parse_form, text_field, float_field, positive_float_field, today_iso
+from utils.cache import attach_user_names
+from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 energy_bp = Blueprint('energy', __name__)
+energy_bp.before_request(require_login)
 
-db = DatabaseManager()
+ENERGY_FORM = {
+    'recorded_date': text_field,
+    'source': text_field,
+    'equipment_name': text_field,
+    'department': text_field,
+    'consumption_kwh': positive_float_field('Consumption must be a positive number'),
+    'cost_amount': float_field,
+    'meter_reading': float_field,
+    'efficiency_percentage': float_field,
+    'target_consumption': float_field,
+    'notes': text_field
+}
+ENERGY_REQUIRED = ('recorded_date', 'source', 'consumption_kwh')
 
 @energy_bp.route('/energy', methods=['GET', 'POST'])
 def energy():
-    if 'user_id' not in session:
-        return redirect(url_for('auth.login'))
-    
     if request.method == 'POST':
         try:
-            data = {
-                'recorded_date': request.form.get('recorded_date'),
-                'source': request.form.get('source'),
-                'equipment_name': request.form.get('equipment_name'),
-                'department': request.form.get('department'),
-                'consumption_kwh': safe_float_convert(request.form.get('consumption_kwh')),
-                'cost_amount': safe_float_convert(request.form.get('cost_amount')),
-                'meter_reading': safe_float_convert(request.form.get('meter_reading')),
-                'efficiency_percentage': safe_float_convert(request.form.get('efficiency_percentage')),
-                'target_consumption': safe_float_convert(request.form.get('target_consumption')),
-                'notes': request.form.get('notes'),
-                'recorded_by': session.get('user_id')
-            }
-            
-            # Validate required fields
-            required_fields = ['recorded_date', 'source', 'consumption_kwh']
-            missing_fields = validate_required_fields(data, required_fields)
+            data, errors = parse_form(request.form, ENERGY_FORM, ENERGY_REQUIRED)
             
-            if missing_fields:
-                flash(f'Required fields missing: {", ".join(missing_fields)}', 'error')
+            if errors:
+                for error in errors:
+                    flash(error, 'error')
                 return redirect(url_for('energy.energy'))
             
-            if data['consumption_kwh'] <= 0:
-                flash('Consumption must be a positive number', 'error')
-                return redirect(url_for('energy.energy'))
+            data['recorded_by'] = session.get('user_id')
             
             # Remove empty values
             data = {k: v for k, v in data.items() if v is not None and v != '' and v != 0.0}
@@ -63,15 +58,14 @@ def energy():
     
     # Get recent energy records
     energy_records = db.execute_query("""
-        SELECT ec.*, u.full_name as recorded_by_name
-        FROM energy_consumption ec
-        LEFT JOIN users u ON ec.recorded_by = u.id
-        ORDER BY ec.recorded_date DESC, ec.created_at DESC
+        SELECT * FROM energy_consumption
+        ORDER BY recorded_date DESC, created_at DESC
         LIMIT 50
     """)
+    attach_user_names(db, energy_records, 'recorded_by', 'recorded_by_name')
     
     # Add today's date for the form
-    today = date.today().isoformat()
+    today = today_iso()
     
     return render_template('energy.html', 
                          energy_records=energy_records or [],
@@ -3,30 +3,25 @@ Dersa EcoQuality - Main Application Routes
 Dashboard and core functionality
 """
 
-from flask import Blueprint, request, render_template, redirect, url_for, flash, session
-from data.database import DatabaseManager
-from datetime import datetime, date, timedelta
+from flask import Blueprint, render_template, redirect, url_for, flash, session
+from data.db import db
+from routes.auth import require_login
+from utils.helpers import current_month_start
+from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 main_bp = Blueprint('main', __name__)
-
-db = DatabaseManager()
+main_bp.before_request(require_login)
 
 @main_bp.route('/')
 def home():
-    if 'user_id' in session:
-        return redirect(url_for('main.dashboard'))
-    return redirect(url_for('auth.login'))
+    return redirect(url_for('main.dashboard'))
 
 @main_bp.route('/dashboard')
 def dashboard():
-    if 'user_id' not in session:
-        return redirect(url_for('auth.login'))
-    
     try:
-        today = date.today()
-        month_start = today.replace(day=1)
+        month_start = current_month_start()
         
         # Get KPIs
         kpis = {
@@ -75,9 +70,10 @@ def dashboard():
             LIMIT 10
         """)
         
-        # Get recent tests
+        # Get recent tests (only the columns the dashboard shows)
         recent_tests = db.execute_query("""
-            SELECT qt.*, pb.batch_number 
+            SELECT qt.id, qt.batch_id, qt.test_date, qt.test_type, qt.pass_fail,
+                   qt.iso_compliant, pb.batch_number
             FROM quality_tests qt
             LEFT JOIN production_batches pb ON qt.batch_id = pb.id
             ORDER BY qt.test_date DESC 
@@ -99,9 +95,6 @@ def dashboard():
 
 @main_bp.route('/users')
 def users():
-    if 'user_id' not in session:
-        return redirect(url_for('auth.login'))
-    
     if session.get('role') != 'admin':
         flash('Access denied', 'error')
         return redirect(url_for('main.dashboard'))
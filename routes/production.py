@@ -3,23 +3,47 @@ Dersa EcoQuality - Production Routes
 Production batch management and tracking
 """
 
-from flask import Blueprint, request, render_template, redirect, url_for, flash, session
-from data.database import DatabaseManager
-from utils.helpers import validate_required_fields, safe_int_convert, safe_float_convert
-from datetime import datetime, date
+from flask import Blueprint, request, render_template, stream_template, redirect, url_for, flash, session, get_flashed_messages
+from data.db import db
+from routes.auth import require_login
+from utils.helpers import (parse_form, text_field, positive_int_field, float_range_field,
+                           parse_page_limit, parse_page_cursor, make_page_cursor, today_iso)
+from utils.cache import attach_user_names
+from utils.query import FilteredQuery
+from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 production_bp = Blueprint('production', __name__)
+production_bp.before_request(require_login)
 
-db = DatabaseManager()
+PRODUCTION_FORM = {
+    'batch_number': text_field,
+    'product_type': text_field,
+    'production_date': text_field,
+    'planned_quantity': positive_int_field('Planned quantity must be a positive number'),
+    'kiln_number': text_field,
+    'firing_temperature': float_range_field(500, 1500, 'Firing temperature must be between 500 and 1500°C'),
+    'firing_duration': text_field,
+    'notes': text_field
+}
+PRODUCTION_REQUIRED = ('batch_number', 'product_type', 'production_date', 'planned_quantity')
+
+# Keyset pagination: the cursor filter resumes strictly after the last row of the previous page
+PRODUCTION_BATCHES_QUERY = FilteredQuery(
+    "SELECT pb.* FROM production_batches pb",
+    [
+        ('status', "pb.status = ?"),
+        ('date_from', "pb.production_date >= ?"),
+        ('date_to', "pb.production_date <= ?"),
+        ('cursor', "(pb.production_date, pb.id) < (?, ?)")
+    ],
+    "pb.production_date DESC, pb.id DESC",
+    tail="LIMIT ?"
+)
 
 @production_bp.route('/production', methods=['GET', 'POST'])
 def production():
-    if 'user_id' not in session:
-        flash('Please log in to access this page', 'error')
-        return redirect(url_for('auth.login'))
-    
     if request.method == 'POST':
         return create_production_lot()
     
@@ -28,72 +52,29 @@ def production():
 def create_production_lot():
     """Create a new production lot"""
     try:
-        # Extract form data
-        form_data = {
-            'batch_number': request.form.get('batch_number', '').strip(),
-            'product_type': request.form.get('product_type', '').strip(),
-            'production_date': request.form.get('production_date', '').strip(),
-            'planned_quantity': request.form.get('planned_quantity', '').strip(),
-            'kiln_number': request.form.get('kiln_number', '').strip(),
-            'firing_temperature': request.form.get('firing_temperature', '').strip(),
-            'firing_duration': request.form.get('firing_duration', '').strip(),
-            'notes': request.form.get('notes', '').strip()
-        }
-        
-        # Validate required fields
-        required_fields = ['batch_number', 'product_type', 'production_date', 'planned_quantity']
-        missing_fields = validate_required_fields(form_data, required_fields)
-        
-        if missing_fields:
-            flash(f'Required fields missing: {", ".join(missing_fields)}', 'error')
-            return redirect(url_for('production.production'))
+        # Extract, validate and convert form data
+        lot_data, errors = parse_form(request.form, PRODUCTION_FORM, PRODUCTION_REQUIRED)
         
-        # Validate and convert data types
-        planned_quantity = safe_int_convert(form_data['planned_quantity'])
-        if planned_quantity <= 0:
-            flash('Planned quantity must be a positive number', 'error')
-            return redirect(url_for('production.production'))
-        
-        firing_temperature = None
-        if form_data['firing_temperature']:
-            firing_temperature = safe_float_convert(form_data['firing_temperature'])
-            if firing_temperature < 500 or firing_temperature > 1500:
-                flash('Firing temperature must be between 500 and 1500°C', 'error')
-                return redirect(url_for('production.production'))
-        
-        # Check for duplicate batch number
-        existing_batch = db.execute_single(
-            "SELECT id, batch_number FROM production_batches WHERE batch_number = ?", 
-            (form_data['batch_number'],)
-        )
-        
-        if existing_batch:
-            flash(f'Error: Batch number "{form_data["batch_number"]}" already exists', 'error')
+        if errors:
+            for error in errors:
+                flash(error, 'error')
             return redirect(url_for('production.production'))
         
         # Prepare data for database insertion
-        lot_data = {
-            'batch_number': form_data['batch_number'],
-            'product_type': form_data['product_type'],
-            'production_date': form_data['production_date'],
-            'planned_quantity': planned_quantity,
-            'kiln_number': form_data['kiln_number'] if form_data['kiln_number'] else None,
-            'firing_temperature': firing_temperature,
-            'firing_duration': form_data['firing_duration'] if form_data['firing_duration'] else None,
+        lot_data.update({
             'supervisor_id': session.get('user_id'),
-            'notes': form_data['notes'] if form_data['notes'] else None,
             'status': 'planned',
             'actual_quantity': None
-        }
-        
-        # Insert into database
-        result = db.insert_record('production_batches', lot_data)
+        })
         
+        # Insert into database; an existing batch number leaves the table untouched
+        result = db.insert_record_if_absent('production_batches', lot_data, 'batch_number')
+
         if result:
-            flash(f'Production lot "{form_data["batch_number"]}" created successfully', 'success')
-            logger.info(f"Production lot created: {form_data['batch_number']} by user {session.get('username')}")
+            flash(f'Production lot "{lot_data["batch_number"]}" created successfully', 'success')
+            logger.info(f"Production lot created: {lot_data['batch_number']} by user {session.get('username')}")
         else:
-            flash('Error: Unable to create production lot', 'error')
+            flash(f'Error: Batch number "{lot_data["batch_number"]}" already exists', 'error')
         
         return redirect(url_for('production.production'))
         
@@ -109,50 +90,35 @@ def display_production_lots():
         status_filter = request.args.get('status', '').strip()
         date_from = request.args.get('date_from', '').strip()
         date_to = request.args.get('date_to', '').strip()
+        page_cursor = parse_page_cursor(request.args.get('cursor'))
+        limit = parse_page_limit(request.args.get('limit'))
         
-        # Build query with filters
-        base_query = """
-            SELECT 
-                pb.*,
-                u.full_name as supervisor_name,
-                u.username as supervisor_username
-            FROM production_batches pb
-            LEFT JOIN users u ON pb.supervisor_id = u.id
-        """
-        
-        conditions = []
-        params = []
-        
-        if status_filter:
-            conditions.append("pb.status = ?")
-            params.append(status_filter)
-        
-        if date_from:
-            conditions.append("pb.production_date >= ?")
-            params.append(date_from)
-        
-        if date_to:
-            conditions.append("pb.production_date <= ?")
-            params.append(date_to)
-        
-        if conditions:
-            base_query += " WHERE " + " AND ".join(conditions)
-        
-        base_query += " ORDER BY pb.production_date DESC, pb.created_at DESC"
-        
-        # Execute query
-        batches = db.execute_query(base_query, tuple(params)) if params else db.execute_query(base_query)
+        # Execute the prebuilt query for this combination of filters
+        filters = {'status': status_filter, 'date_from': date_from, 'date_to': date_to, 'cursor': page_cursor}
+        batches = PRODUCTION_BATCHES_QUERY.run(db, filters, (limit,))
         
         if batches is None:
             batches = []
+        attach_user_names(db, batches, 'supervisor_id', 'supervisor_name', 'supervisor_username')
+        
+        next_url = None
+        if len(batches) == limit:
+            page_args = request.args.to_dict()
+            page_args['cursor'] = make_page_cursor(batches[-1], 'production_date')
+            next_url = url_for('production.production', **page_args)
         
         # Add today's date for the form
-        today = date.today().isoformat()
+        today = today_iso()
         
-        return render_template('production.html', batches=batches, today=today)
+        # Pop flashed messages now: the session cookie is sent before the streamed body renders
+        get_flashed_messages(with_categories=True)
+        # Trade-off of streaming: the template is loaded here, so a missing or invalid
+        # template still reaches the fallback below, but an error raised while the body
+        # renders comes after the 200 status and truncates the page (Werkzeug logs it)
+        return stream_template('production.html', batches=batches, today=today, next_url=next_url)
         
     except Exception as e:
         logger.error(f"Error displaying production lots: {e}", exc_info=True)
         flash('Error loading production lots', 'error')
-        today = date.today().isoformat()
+        today = today_iso()
         return render_template('production.html', batches=[], today=today)
\ No newline at end of file
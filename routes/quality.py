@@ -3,44 +3,47 @@ Dersa EcoQuality - Quality Control Routes
 Quality testing and compliance management
 """
 
-from flask import Blueprint, request, render_template, redirect, url_for, flash, session
-from data.database import DatabaseManager
-from utils.helpers import validate_required_fields, safe_int_convert, safe_float_convert, save_uploaded_file
-from datetime import datetime, date
+from flask import Blueprint, request, render_template, flash, session
+from data.db import db
+from routes.auth import require_login
+from utils.helpers import parse_form, text_field, int_field, float_field, save_uploaded_file, today_iso
+from utils.cache import attach_user_names, get_iso_standards
+from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 quality_bp = Blueprint('quality', __name__)
+quality_bp.before_request(require_login)
 
-db = DatabaseManager()
+QUALITY_TEST_FORM = {
+    'batch_id': int_field,
+    'test_type': text_field,
+    'test_date': text_field,
+    'length_mm': float_field,
+    'width_mm': float_field,
+    'thickness_mm': float_field,
+    'warping_percentage': float_field,
+    'water_absorption_percentage': float_field,
+    'breaking_strength_n': int_field,
+    'abrasion_resistance_pei': int_field,
+    'defect_type': text_field,
+    'defect_count': int_field,
+    'defect_severity': text_field,
+    'defect_description': text_field,
+    'equipment_used': text_field,
+    'test_notes': text_field
+}
+
+# Measurements checked against the ISO standards when a test is recorded
+ISO_CHECK_PARAMETERS = frozenset({'length_mm', 'water_absorption_percentage', 'breaking_strength_n', 'warping_percentage'})
 
 @quality_bp.route('/quality', methods=['GET', 'POST'])
 def quality():
-    if 'user_id' not in session:
-        return redirect(url_for('auth.login'))
-    
     if request.method == 'POST':
         try:
-            data = {
-                'batch_id': safe_int_convert(request.form.get('batch_id')),
-                'test_type': request.form.get('test_type'),
-                'test_date': request.form.get('test_date'),
-                'technician_id': session.get('user_id'),
-                'length_mm': safe_float_convert(request.form.get('length_mm')),
-                'width_mm': safe_float_convert(request.form.get('width_mm')),
-                'thickness_mm': safe_float_convert(request.form.get('thickness_mm')),
-                'warping_percentage': safe_float_convert(request.form.get('warping_percentage')),
-                'water_absorption_percentage': safe_float_convert(request.form.get('water_absorption_percentage')),
-                'breaking_strength_n': safe_int_convert(request.form.get('breaking_strength_n')),
-                'abrasion_resistance_pei': safe_int_convert(request.form.get('abrasion_resistance_pei')),
-                'defect_type': request.form.get('defect_type', 'none'),
-                'defect_count': safe_int_convert(request.form.get('defect_count')),
-                'defect_severity': request.form.get('defect_severity', 'minor'),
-                'defect_description': request.form.get('defect_description'),
-                'equipment_used': request.form.get('equipment_used'),
-                'test_notes': request.form.get('test_notes'),
-                'status': 'completed'
-            }
+            data, _ = parse_form(request.form, QUALITY_TEST_FORM)
+            data['technician_id'] = session.get('user_id')
+            data['status'] = 'completed'
             
             # Handle photo upload
             defect_photo = request.files.get('defect_photo')
@@ -73,7 +76,7 @@ def quality():
             flash('Error recording quality test', 'error')
     
     # Get data for the page
-    iso_standards = db.execute_query("SELECT * FROM iso_standards WHERE is_active = 1 ORDER BY standard_code")
+    iso_standards = get_iso_standards(db)
     production_batches = db.execute_query("""
         SELECT id, batch_number, product_type, production_date, status 
         FROM production_batches 
@@ -83,17 +86,16 @@ def quality():
     
     # Get recent quality tests
     recent_tests = db.execute_query("""
-        SELECT qt.*, pb.batch_number, pb.product_type,
-               u.full_name as technician_name
+        SELECT qt.*, pb.batch_number, pb.product_type
         FROM quality_tests qt
         LEFT JOIN production_batches pb ON qt.batch_id = pb.id
-        LEFT JOIN users u ON qt.technician_id = u.id
         ORDER BY qt.test_date DESC, qt.created_at DESC
         LIMIT 20
     """)
+    attach_user_names(db, recent_tests, 'technician_id', 'technician_name')
     
     # Add today's date for the form
-    today = date.today().isoformat()
+    today = today_iso()
     
     return render_template('quality.html', 
                          iso_standards=iso_standards or [],
@@ -104,16 +106,13 @@ def quality():
 def check_iso_compliance(data):
     """Simple ISO compliance check based on standards"""
     try:
-        # Get applicable standards for the test
-        standards = db.execute_query("""
-            SELECT * FROM iso_standards 
-            WHERE is_active = 1 AND parameter_name IN (?, ?, ?, ?)
-        """, ('length_mm', 'water_absorption_percentage', 'breaking_strength_n', 'warping_percentage'))
-        
+        # Check against the cached standards for the measured parameters
         compliant = True
         
-        for standard in standards or []:
+        for standard in get_iso_standards(db):
             param_name = standard['parameter_name']
+            if param_name not in ISO_CHECK_PARAMETERS:
+                continue
             value = data.get(param_name)
             
             if value is not None and value > 0:
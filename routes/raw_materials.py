@@ -3,53 +3,58 @@ Dersa EcoQuality - Raw Materials Routes
 Raw materials management and inventory
 """
 
-from flask import Blueprint, request, render_template, redirect, url_for, flash, session
-from data.database import DatabaseManager
-from utils.helpers import validate_required_fields, safe_float_convert
-from datetime import datetime, date
+from flask import Blueprint, request, stream_template, redirect, url_for, flash, session, get_flashed_messages
+from data.db import db
+from routes.auth import require_login
+from utils.helpers import (parse_form, text_field, float_field, positive_float_field,
+                           parse_page_limit, parse_page_cursor, make_page_cursor, today_iso)
+from utils.cache import attach_user_names
+from utils.query import FilteredQuery
+from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 raw_materials_bp = Blueprint('raw_materials', __name__)
+raw_materials_bp.before_request(require_login)
 
-db = DatabaseManager()
+RAW_MATERIAL_FORM = {
+    'material_code': text_field,
+    'material_name': text_field,
+    'material_type': text_field,
+    'reception_date': text_field,
+    'lot_number': text_field,
+    'quantity_kg': positive_float_field('Quantity must be a positive number'),
+    'unit_cost': float_field,
+    'humidity_percentage': float_field,
+    'particle_size_microns': float_field,
+    'chemical_composition': text_field,
+    'inspection_notes': text_field,
+    'storage_location': text_field,
+    'expiry_date': text_field
+}
+RAW_MATERIAL_REQUIRED = ('material_code', 'material_name', 'material_type', 'reception_date', 'quantity_kg')
+
+# Keyset pagination: the cursor filter resumes strictly after the last row of the previous page
+RAW_MATERIALS_QUERY = FilteredQuery(
+    "SELECT rm.* FROM raw_materials rm",
+    [('cursor', "(rm.reception_date, rm.id) < (?, ?)")],
+    "rm.reception_date DESC, rm.id DESC",
+    tail="LIMIT ?"
+)
 
 @raw_materials_bp.route('/raw_materials', methods=['GET', 'POST'])
 def raw_materials():
-    if 'user_id' not in session:
-        return redirect(url_for('auth.login'))
-    
     if request.method == 'POST':
         try:
-            data = {
-                'material_code': request.form.get('material_code'),
-                'material_name': request.form.get('material_name'),
-                'material_type': request.form.get('material_type'),
-                'reception_date': request.form.get('reception_date'),
-                'lot_number': request.form.get('lot_number'),
-                'quantity_kg': safe_float_convert(request.form.get('quantity_kg')),
-                'unit_cost': safe_float_convert(request.form.get('unit_cost')),
-                'humidity_percentage': safe_float_convert(request.form.get('humidity_percentage')),
-                'particle_size_microns': safe_float_convert(request.form.get('particle_size_microns')),
-                'chemical_composition': request.form.get('chemical_composition'),
-                'inspection_notes': request.form.get('inspection_notes'),
-                'storage_location': request.form.get('storage_location'),
-                'expiry_date': request.form.get('expiry_date'),
-                'status': 'en_attente',
-                'inspected_by': session.get('user_id')
-            }
-            
-            # Validate required fields
-            required_fields = ['material_code', 'material_name', 'material_type', 'reception_date', 'quantity_kg']
-            missing_fields = validate_required_fields(data, required_fields)
+            data, errors = parse_form(request.form, RAW_MATERIAL_FORM, RAW_MATERIAL_REQUIRED)
             
-            if missing_fields:
-                flash(f'Required fields missing: {", ".join(missing_fields)}', 'error')
+            if errors:
+                for error in errors:
+                    flash(error, 'error')
                 return redirect(url_for('raw_materials.raw_materials'))
             
-            if data['quantity_kg'] <= 0:
-                flash('Quantity must be a positive number', 'error')
-                return redirect(url_for('raw_materials.raw_materials'))
+            data['status'] = 'en_attente'
+            data['inspected_by'] = session.get('user_id')
             
             # Check for duplicate material code
             existing = db.execute_single(
@@ -75,21 +80,26 @@ def raw_materials():
             logger.error(f"Error recording raw material: {e}")
             flash('Error recording raw material', 'error')
     
-    # Get recent raw material records
-    materials = db.execute_query("""
-        SELECT rm.*, 
-               u1.full_name as inspected_by_name,
-               u2.full_name as approved_by_name
-        FROM raw_materials rm
-        LEFT JOIN users u1 ON rm.inspected_by = u1.id
-        LEFT JOIN users u2 ON rm.approved_by = u2.id
-        ORDER BY rm.reception_date DESC, rm.created_at DESC
-        LIMIT 50
-    """)
+    # Get recent raw material records, one keyset page at a time
+    page_cursor = parse_page_cursor(request.args.get('cursor'))
+    limit = parse_page_limit(request.args.get('limit'))
+    
+    materials = RAW_MATERIALS_QUERY.run(db, {'cursor': page_cursor}, (limit,)) or []
+    attach_user_names(db, materials, 'inspected_by', 'inspected_by_name')
+    attach_user_names(db, materials, 'approved_by', 'approved_by_name')
+    
+    next_url = None
+    if len(materials) == limit:
+        page_args = request.args.to_dict()
+        page_args['cursor'] = make_page_cursor(materials[-1], 'reception_date')
+        next_url = url_for('raw_materials.raw_materials', **page_args)
     
     # Add today's date for the form
-    today = date.today().isoformat()
+    today = today_iso()
     
-    return render_template('raw_materials.html', 
-                         materials=materials or [],
-                         today=today)
\ No newline at end of file
+    # Pop flashed messages now: the session cookie is sent before the streamed body renders
+    get_flashed_messages(with_categories=True)
+    return stream_template('raw_materials.html', 
+                         materials=materials,
+                         today=today,
+                         next_url=next_url)
\ No newline at end of file
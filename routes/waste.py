@@ -3,50 +3,67 @@ Dersa EcoQuality - Waste Management Routes
 Waste tracking and recycling management
 """
 
-from flask import Blueprint, request, render_template, redirect, url_for, flash, session
-from data.database import DatabaseManager
-from utils.helpers import validate_required_fields, safe_float_convert
-from datetime import datetime, date
+from flask import Blueprint, request, stream_template, redirect, url_for, flash, session, get_flashed_messages
+from data.db import db
+from routes.auth import require_login
+from utils.helpers import (parse_form, text_field, float_field, positive_float_field,
+                           parse_page_limit, parse_page_cursor, make_page_cursor, today_iso,
+                           current_month_start)
+from utils.cache import attach_user_names
+from utils.query import FilteredQuery
+from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 waste_bp = Blueprint('waste', __name__)
+waste_bp.before_request(require_login)
 
-db = DatabaseManager()
+WASTE_FORM = {
+    'recorded_date': text_field,
+    'waste_type': text_field,
+    'quantity_kg': positive_float_field('Quantity must be a positive number'),
+    'source_department': text_field,
+    'disposal_method': text_field,
+    'recycling_percentage': float_field,
+    'valorization_amount': float_field,
+    'cost_amount': float_field,
+    'destination': text_field,
+    'certificate_number': text_field,
+    'notes': text_field
+}
+WASTE_REQUIRED = ('recorded_date', 'waste_type', 'quantity_kg')
+
+# Keyset pagination: the cursor filter resumes strictly after the last row of the previous page
+WASTE_RECORDS_QUERY = FilteredQuery(
+    "SELECT wr.* FROM waste_records wr",
+    [('cursor', "(wr.recorded_date, wr.id) < (?, ?)")],
+    "wr.recorded_date DESC, wr.id DESC",
+    tail="LIMIT ?"
+)
+
+# Month-to-date totals for the summary cards
+WASTE_SUMMARY_SQL = """
+    SELECT
+        SUM(quantity_kg) as total_waste,
+        AVG(recycling_percentage) as avg_recycling_rate,
+        SUM(valorization_amount) as total_valorization,
+        SUM(cost_amount) as total_cost
+    FROM waste_records
+    WHERE recorded_date >= ?
+"""
 
 @waste_bp.route('/waste', methods=['GET', 'POST'])
 def waste():
-    if 'user_id' not in session:
-        return redirect(url_for('auth.login'))
-    
     if request.method == 'POST':
         try:
-            data = {
-                'recorded_date': request.form.get('recorded_date'),
-                'waste_type': request.form.get('waste_type'),
-                'quantity_kg': safe_float_convert(request.form.get('quantity_kg')),
-                'source_department': request.form.get('source_department'),
-                'disposal_method': request.form.get('disposal_method'),
-                'recycling_percentage': safe_float_convert(request.form.get('recycling_percentage')),
-                'valorization_amount': safe_float_convert(request.form.get('valorization_amount')),
-                'cost_amount': safe_float_convert(request.form.get('cost_amount')),
-                'destination': request.form.get('destination'),
-                'certificate_number': request.form.get('certificate_number'),
-                'notes': request.form.get('notes'),
-                'responsible_person_id': session.get('user_id')
-            }
-            
-            # Validate required fields
-            required_fields = ['recorded_date', 'waste_type', 'quantity_kg']
-            missing_fields = validate_required_fields(data, required_fields)
+            data, errors = parse_form(request.form, WASTE_FORM, WASTE_REQUIRED)
             
-            if missing_fields:
-                flash(f'Required fields missing: {", ".join(missing_fields)}', 'error')
+            if errors:
+                for error in errors:
+                    flash(error, 'error')
                 return redirect(url_for('waste.waste'))
             
-            if data['quantity_kg'] <= 0:
-                flash('Quantity must be a positive number', 'error')
-                return redirect(url_for('waste.waste'))
+            data['responsible_person_id'] = session.get('user_id')
             
             # Remove empty values
             data = {k: v for k, v in data.items() if v is not None and v != '' and v != 0.0}
@@ -62,18 +79,28 @@ def waste():
             logger.error(f"Error recording waste: {e}")
             flash('Error recording waste', 'error')
     
-    # Get recent waste records
-    waste_records = db.execute_query("""
-        SELECT wr.*, u.full_name as responsible_person_name
-        FROM waste_records wr
-        LEFT JOIN users u ON wr.responsible_person_id = u.id
-        ORDER BY wr.recorded_date DESC, wr.created_at DESC
-        LIMIT 50
-    """)
+    # Get recent waste records, one keyset page at a time
+    page_cursor = parse_page_cursor(request.args.get('cursor'))
+    limit = parse_page_limit(request.args.get('limit'))
+    
+    waste_records = WASTE_RECORDS_QUERY.run(db, {'cursor': page_cursor}, (limit,)) or []
+    attach_user_names(db, waste_records, 'responsible_person_id', 'responsible_person_name')
+    
+    next_url = None
+    if len(waste_records) == limit:
+        page_args = request.args.to_dict()
+        page_args['cursor'] = make_page_cursor(waste_records[-1], 'recorded_date')
+        next_url = url_for('waste.waste', **page_args)
+    
+    waste_summary = db.execute_single(WASTE_SUMMARY_SQL, (current_month_start().isoformat(),)) or {}
     
     # Add today's date for the form
-    today = date.today().isoformat()
+    today = today_iso()
     
-    return render_template('waste.html', 
-                         waste_records=waste_records or [],
-                         today=today)
\ No newline at end of file
+    # Pop flashed messages now: the session cookie is sent before the streamed body renders
+    get_flashed_messages(with_categories=True)
+    return stream_template('waste.html', 
+                         waste_records=waste_records,
+                         waste_summary=waste_summary,
+                         today=today,
+                         next_url=next_url)
\ No newline at end of file
@@ -3,44 +3,164 @@ Dersa EcoQuality - Business Logic Services
 Service layer for quality management operations
 """
 
+import os
+import hmac
+import base64
+import hashlib
+import secrets
 import bcrypt
 from typing import Dict, List, Optional, Any
-from datetime import datetime, date, timedelta
+from datetime import date, timedelta
 from models import DatabaseManager, UserRole, TestStatus, DefectType, EnergySource, WasteType, BatchStatus
+from utils.cache import (TTLCache, TTLDict, attach_user_names, get_iso_standards, invalidate_user_names,
+                         iso_standards_cache)
+from utils.query import FilteredQuery
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Successful bcrypt checks are remembered for this many seconds (0 disables the cache)
+PASSWORD_VERIFY_CACHE_TTL = int(os.getenv('PASSWORD_VERIFY_CACHE_TTL', '60'))
+PASSWORD_VERIFY_CACHE_SIZE = 1024
+# Per-process key: cache entries hold an HMAC of the password, never the password itself
+_verify_pepper = secrets.token_bytes(32)
+_verified_passwords = TTLDict(PASSWORD_VERIFY_CACHE_SIZE, PASSWORD_VERIFY_CACHE_TTL)
+
+# bcrypt work factor for new hashes; stored hashes below it are upgraded on login
+DEFAULT_BCRYPT_COST = 12
+# Marks hashes of base64(sha256(password)); unmarked hashes are bcrypt of the raw password
+PREHASH_PREFIX = 'sha256$'
+
+def _prehash(password: str) -> bytes:
+    """64 ASCII bytes: under bcrypt's 72-byte limit and free of NUL bytes"""
+    return base64.b64encode(hashlib.sha256(password.encode('utf-8')).digest())
+
+def _checkpw(password: str, hashed: str) -> bool:
+    """Run bcrypt for either stored scheme and compare in constant time"""
+    if hashed.startswith(PREHASH_PREFIX):
+        secret, stored = _prehash(password), hashed[len(PREHASH_PREFIX):].encode('utf-8')
+    else:
+        secret, stored = password.encode('utf-8'), hashed.encode('utf-8')
+    return hmac.compare_digest(bcrypt.hashpw(secret, stored), stored)
+
+PRODUCTION_BATCHES_QUERY = FilteredQuery(
+    """
+    SELECT pb.*
+    FROM production_batches pb
+    """,
+    [
+        ('status', "pb.status = %s"),
+        ('date_from', "pb.production_date >= %s"),
+        ('date_to', "pb.production_date <= %s")
+    ],
+    "pb.production_date DESC"
+)
+
+QUALITY_TESTS_QUERY = FilteredQuery(
+    """
+    SELECT qt.*, pb.batch_number, pb.product_type
+    FROM quality_tests qt
+    LEFT JOIN production_batches pb ON qt.batch_id = pb.id
+    """,
+    [
+        ('batch_id', "qt.batch_id = %s"),
+        ('status', "qt.status = %s"),
+        ('date_from', "qt.test_date >= %s"),
+        ('date_to', "qt.test_date <= %s")
+    ],
+    "qt.test_date DESC"
+)
+
+ENERGY_CONSUMPTION_QUERY = FilteredQuery(
+    """
+    SELECT ec.*
+    FROM energy_consumption ec
+    """,
+    [
+        ('source', "ec.source = %s"),
+        ('date_from', "ec.recorded_date >= %s"),
+        ('date_to', "ec.recorded_date <= %s"),
+        ('department', "ec.department = %s")
+    ],
+    "ec.recorded_date DESC, ec.recorded_time DESC"
+)
+
+WASTE_RECORDS_QUERY = FilteredQuery(
+    """
+    SELECT wr.*
+    FROM waste_records wr
+    """,
+    [
+        ('waste_type', "wr.waste_type = %s"),
+        ('date_from', "wr.recorded_date >= %s"),
+        ('date_to', "wr.recorded_date <= %s")
+    ],
+    "wr.recorded_date DESC"
+)
+
+# Profile columns returned to callers; password_hash is never included
+USER_PROFILE_COLUMNS = "id, username, email, full_name, role, department, is_active, created_at, last_login"
+LOGIN_UPDATE_SQL = f"""
+    UPDATE users
+    SET last_login = CURRENT_TIMESTAMP, password_hash = COALESCE(%s, password_hash)
+    WHERE id = %s
+    RETURNING {USER_PROFILE_COLUMNS}
+"""
+
 class AuthService:
     def __init__(self, db: DatabaseManager):
         self.db = db
+        self.cost = int(os.getenv('BCRYPT_COST', DEFAULT_BCRYPT_COST))
 
     def hash_password(self, password: str) -> str:
-        """Hash password using bcrypt"""
-        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        """Hash password using bcrypt over its SHA-256 digest (no 72-byte truncation)"""
+        return PREHASH_PREFIX + bcrypt.hashpw(_prehash(password), bcrypt.gensalt(rounds=self.cost)).decode('utf-8')
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """Check if a stored hash uses the raw-password scheme or a lower cost than configured"""
+        if not hashed.startswith(PREHASH_PREFIX):
+            return True
+        try:
+            # $2b$<cost>$...
+            return int(hashed[len(PREHASH_PREFIX) + 4:len(PREHASH_PREFIX) + 6]) < self.cost
+        except ValueError:
+            return False
+
+    def verify_password(self, password: str, hashed: str, username: Optional[str] = None) -> bool:
+        """
+        Verify password against hash
+        With a username, a recent successful check for the same password and
+        hash is reused instead of running bcrypt again; failures are never cached
+        """
+        if not username or PASSWORD_VERIFY_CACHE_TTL <= 0:
+            return _checkpw(password, hashed)
+        
+        key = (username, hmac.new(_verify_pepper, password.encode('utf-8'), 'sha256').hexdigest(), hashed)
+        if _verified_passwords.get(key):
+            return True
+        if _checkpw(password, hashed):
+            _verified_passwords.set(key, True)
+            return True
+        return False
 
-    def verify_password(self, password: str, hashed: str) -> bool:
-        """Verify password against hash"""
-        return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    def forget_verified_password(self, username: str):
+        """Drop cached password checks for a user whose password changed"""
+        _verified_passwords.discard_where(lambda key: key[0] == username)
 
     def authenticate_user(self, username: str, password: str) -> Optional[Dict[str, Any]]:
         """Authenticate user credentials"""
         try:
             user = self.db.execute_single(
-                "SELECT * FROM users WHERE username = %s AND is_active = true",
+                "SELECT id, password_hash FROM users WHERE username = %s AND is_active = true",
                 (username,)
             )
             
-            if user and self.verify_password(password, user['password_hash']):
-                # Update last login
-                self.db.execute_single(
-                    "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = %s",
-                    (user['id'],)
-                )
+            if user and self.verify_password(password, user['password_hash'], username):
+                # Upgrade hashes created under the raw-password scheme or an older, cheaper cost
+                new_hash = self.hash_password(password) if self.needs_rehash(user['password_hash']) else None
                 
-                # Remove password from response
-                del user['password_hash']
-                return user
+                # Stamp the login (and store any upgraded hash) and read the profile back in one statement
+                return self.db.execute_single(LOGIN_UPDATE_SQL, (new_hash, user['id']))
             
             return None
         except Exception as e:
@@ -52,11 +172,13 @@ class AuthService:
         try:
             # Hash password
             user_data['password_hash'] = self.hash_password(user_data.pop('password'))
+            self.forget_verified_password(user_data.get('username'))
             
             # Insert user
             user = self.db.insert_record('users', user_data)
             
             if user:
+                invalidate_user_names(self.db)
                 del user['password_hash']
             
             return user
@@ -64,6 +186,18 @@ class AuthService:
             logger.error(f"User creation error: {e}")
             return None
 
+# Status changes are stamped by the database clock
+BATCH_STATUS_UPDATE_SQL = """
+    UPDATE production_batches
+    SET status = %(status)s, updated_at = CURRENT_TIMESTAMP
+    WHERE id = %(id)s
+"""
+BATCH_STATUS_NOTES_UPDATE_SQL = """
+    UPDATE production_batches
+    SET status = %(status)s, updated_at = CURRENT_TIMESTAMP, notes = %(notes)s
+    WHERE id = %(id)s
+"""
+
 class ProductionService:
     def __init__(self, db: DatabaseManager):
         self.db = db
@@ -79,34 +213,8 @@ class ProductionService:
     def get_production_batches(self, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """Get production batches with optional filters"""
         try:
-            base_query = """
-                SELECT pb.*, u.full_name as supervisor_name
-                FROM production_batches pb
-                LEFT JOIN users u ON pb.supervisor_id = u.id
-            """
-            
-            conditions = []
-            params = []
-            
-            if filters:
-                if filters.get('status'):
-                    conditions.append("pb.status = %s")
-                    params.append(filters['status'])
-                
-                if filters.get('date_from'):
-                    conditions.append("pb.production_date >= %s")
-                    params.append(filters['date_from'])
-                
-                if filters.get('date_to'):
-                    conditions.append("pb.production_date <= %s")
-                    params.append(filters['date_to'])
-            
-            if conditions:
-                base_query += " WHERE " + " AND ".join(conditions)
-            
-            base_query += " ORDER BY pb.production_date DESC"
-            
-            return self.db.execute_query(base_query, tuple(params))
+            return attach_user_names(self.db, PRODUCTION_BATCHES_QUERY.run(self.db, filters),
+                                     'supervisor_id', 'supervisor_name')
         except Exception as e:
             logger.error(f"Batch retrieval error: {e}")
             return []
@@ -114,31 +222,36 @@ class ProductionService:
     def update_batch_status(self, batch_id: int, status: str, notes: str = None) -> bool:
         """Update batch status"""
         try:
-            update_data = {'status': status, 'updated_at': datetime.now()}
+            params = {'id': batch_id, 'status': status}
             if notes:
-                update_data['notes'] = notes
-            
-            query = """
-                UPDATE production_batches 
-                SET status = %(status)s, updated_at = %(updated_at)s
-            """
-            params = update_data
-            
-            if notes:
-                query += ", notes = %(notes)s"
-            
-            query += " WHERE id = %(id)s"
-            params['id'] = batch_id
+                params['notes'] = notes
+                query = BATCH_STATUS_NOTES_UPDATE_SQL
+            else:
+                query = BATCH_STATUS_UPDATE_SQL
             
-            self.db.execute_single(query, params)
+            self.db.execute_query(query, params)
             return True
         except Exception as e:
             logger.error(f"Batch status update error: {e}")
             return False
 
+# Test-data field checked by the ISO standards whose parameter_name contains each key
+ISO_PARAM_FIELDS = {
+    'length': 'length_mm',  # dimensional compliance (ISO 13006)
+    'width': 'width_mm',
+    'thickness': 'thickness_mm',
+    'warping': 'warping_percentage',  # ≤0.6% for rectified tiles
+    'water_absorption': 'water_absorption_percentage',  # ≤3% for gres cérame
+    'breaking_strength': 'breaking_strength_n'  # min 1300N for floor tiles
+}
+
 class QualityService:
-    def __init__(self, db: DatabaseManager):
+    def __init__(self, db: DatabaseManager, standards_cache: Optional[TTLCache] = None):
         self.db = db
+        # Active ISO standards, shared with everything else using this database by default
+        self.standards_cache = standards_cache or iso_standards_cache(db)
+        self._standards_source = None
+        self._standards_indexed = {}
 
     def create_quality_test(self, test_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Create new quality test"""
@@ -154,49 +267,33 @@ class QualityService:
             logger.error(f"Quality test creation error: {e}")
             return None
 
+    def _standards_by_param(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Active ISO standards grouped by ISO_PARAM_FIELDS key, regrouped only when the cache reloads"""
+        standards = get_iso_standards(self.db, self.standards_cache)
+        if standards is not self._standards_source:
+            indexed = {key: [] for key in ISO_PARAM_FIELDS}
+            for standard in standards:
+                param_name = standard['parameter_name'].lower()
+                for key in ISO_PARAM_FIELDS:
+                    if key in param_name:
+                        indexed[key].append(standard)
+            self._standards_source, self._standards_indexed = standards, indexed
+        return self._standards_indexed
+
+    def invalidate_standards(self):
+        """Reload ISO standards on the next compliance check after they are edited"""
+        self.standards_cache.invalidate()
+
     def _check_iso_compliance(self, test_data: Dict[str, Any]) -> bool:
         """Check if test results comply with ISO standards"""
         try:
-            # Get applicable ISO standards
-            standards = self.db.execute_query("""
-                SELECT * FROM iso_standards 
-                WHERE is_active = true
-            """)
-            
-            compliant = True
-            
-            for standard in standards:
-                param_name = standard['parameter_name'].lower()
-                
-                # Check dimensional compliance (ISO 13006)
-                if 'length' in param_name and test_data.get('length_mm'):
-                    if not self._is_within_tolerance(test_data['length_mm'], standard):
-                        compliant = False
-                
-                if 'width' in param_name and test_data.get('width_mm'):
-                    if not self._is_within_tolerance(test_data['width_mm'], standard):
-                        compliant = False
-                
-                if 'thickness' in param_name and test_data.get('thickness_mm'):
-                    if not self._is_within_tolerance(test_data['thickness_mm'], standard):
-                        compliant = False
-                
-                # Check warping (≤0.6% for rectified tiles)
-                if 'warping' in param_name and test_data.get('warping_percentage'):
-                    if not self._is_within_tolerance(test_data['warping_percentage'], standard):
-                        compliant = False
-                
-                # Check water absorption (≤3% for gres cérame)
-                if 'water_absorption' in param_name and test_data.get('water_absorption_percentage'):
-                    if not self._is_within_tolerance(test_data['water_absorption_percentage'], standard):
-                        compliant = False
-                
-                # Check breaking strength (min 1300N for floor tiles)
-                if 'breaking_strength' in param_name and test_data.get('breaking_strength_n'):
-                    if not self._is_within_tolerance(test_data['breaking_strength_n'], standard):
-                        compliant = False
-            
-            return compliant
+            standards = self._standards_by_param()
+            # Every standard on a measured parameter must pass
+            return all(
+                self._is_within_tolerance(test_data[field], standard)
+                for key, field in ISO_PARAM_FIELDS.items() if test_data.get(field)
+                for standard in standards[key]
+            )
         except Exception as e:
             logger.error(f"ISO compliance check error: {e}")
             return False
@@ -212,39 +309,8 @@ class QualityService:
     def get_quality_tests(self, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """Get quality tests with optional filters"""
         try:
-            base_query = """
-                SELECT qt.*, pb.batch_number, pb.product_type, u.full_name as technician_name
-                FROM quality_tests qt
-                LEFT JOIN production_batches pb ON qt.batch_id = pb.id
-                LEFT JOIN users u ON qt.technician_id = u.id
-            """
-            
-            conditions = []
-            params = []
-            
-            if filters:
-                if filters.get('batch_id'):
-                    conditions.append("qt.batch_id = %s")
-                    params.append(filters['batch_id'])
-                
-                if filters.get('status'):
-                    conditions.append("qt.status = %s")
-                    params.append(filters['status'])
-                
-                if filters.get('date_from'):
-                    conditions.append("qt.test_date >= %s")
-                    params.append(filters['date_from'])
-                
-                if filters.get('date_to'):
-                    conditions.append("qt.test_date <= %s")
-                    params.append(filters['date_to'])
-            
-            if conditions:
-                base_query += " WHERE " + " AND ".join(conditions)
-            
-            base_query += " ORDER BY qt.test_date DESC"
-            
-            return self.db.execute_query(base_query, tuple(params))
+            return attach_user_names(self.db, QUALITY_TESTS_QUERY.run(self.db, filters),
+                                     'technician_id', 'technician_name')
         except Exception as e:
             logger.error(f"Quality tests retrieval error: {e}")
             return []
@@ -255,54 +321,30 @@ class EnergyService:
 
     def record_energy_consumption(self, consumption_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Record energy consumption"""
+        records = self.record_energy_consumption_bulk([consumption_data])
+        return records[0] if records else None
+
+    def record_energy_consumption_bulk(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Record many energy consumption readings (CSV/meter imports) with
+        multi-row INSERTs in one transaction
+        Returns the created records, or an empty list on error
+        """
         try:
-            # Calculate efficiency if target is provided
-            if consumption_data.get('target_consumption'):
-                actual = consumption_data['consumption_kwh']
-                target = consumption_data['target_consumption']
-                efficiency = (target / actual) * 100 if actual > 0 else 0
-                consumption_data['efficiency_percentage'] = round(efficiency, 2)
+            # efficiency_percentage is a generated column computed from the target
+            for consumption_data in rows:
+                consumption_data.pop('efficiency_percentage', None)
             
-            return self.db.insert_record('energy_consumption', consumption_data)
+            return self.db.insert_records('energy_consumption', rows)
         except Exception as e:
             logger.error(f"Energy consumption recording error: {e}")
-            return None
+            return []
 
     def get_energy_consumption(self, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """Get energy consumption records"""
         try:
-            base_query = """
-                SELECT ec.*, u.full_name as recorded_by_name
-                FROM energy_consumption ec
-                LEFT JOIN users u ON ec.recorded_by = u.id
-            """
-            
-            conditions = []
-            params = []
-            
-            if filters:
-                if filters.get('source'):
-                    conditions.append("ec.source = %s")
-                    params.append(filters['source'])
-                
-                if filters.get('date_from'):
-                    conditions.append("ec.recorded_date >= %s")
-                    params.append(filters['date_from'])
-                
-                if filters.get('date_to'):
-                    conditions.append("ec.recorded_date <= %s")
-                    params.append(filters['date_to'])
-                
-                if filters.get('department'):
-                    conditions.append("ec.department = %s")
-                    params.append(filters['department'])
-            
-            if conditions:
-                base_query += " WHERE " + " AND ".join(conditions)
-            
-            base_query += " ORDER BY ec.recorded_date DESC, ec.recorded_time DESC"
-            
-            return self.db.execute_query(base_query, tuple(params))
+            return attach_user_names(self.db, ENERGY_CONSUMPTION_QUERY.run(self.db, filters),
+                                     'recorded_by', 'recorded_by_name')
         except Exception as e:
             logger.error(f"Energy consumption retrieval error: {e}")
             return []
@@ -310,12 +352,8 @@ class EnergyService:
     def record_heat_recovery(self, recovery_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Record heat recovery data"""
         try:
-            # Calculate thermal efficiency
-            if recovery_data.get('input_temperature') and recovery_data.get('output_temperature'):
-                input_temp = recovery_data['input_temperature']
-                output_temp = recovery_data['output_temperature']
-                efficiency = ((input_temp - output_temp) / input_temp) * 100 if input_temp > 0 else 0
-                recovery_data['thermal_efficiency_percentage'] = round(efficiency, 2)
+            # thermal_efficiency_percentage is a generated column computed from the temperatures
+            recovery_data.pop('thermal_efficiency_percentage', None)
             
             return self.db.insert_record('heat_recovery', recovery_data)
         except Exception as e:
@@ -328,47 +366,63 @@ class WasteService:
 
     def record_waste(self, waste_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """Record waste data"""
+        records = self.record_waste_bulk([waste_data])
+        return records[0] if records else None
+
+    def record_waste_bulk(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Record many waste entries with multi-row INSERTs in one transaction
+        Returns the created records, or an empty list on error
+        """
         try:
-            return self.db.insert_record('waste_records', waste_data)
+            return self.db.insert_records('waste_records', rows)
         except Exception as e:
             logger.error(f"Waste recording error: {e}")
-            return None
+            return []
 
     def get_waste_records(self, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
         """Get waste records"""
         try:
-            base_query = """
-                SELECT wr.*, u.full_name as responsible_person_name
-                FROM waste_records wr
-                LEFT JOIN users u ON wr.responsible_person_id = u.id
-            """
-            
-            conditions = []
-            params = []
-            
-            if filters:
-                if filters.get('waste_type'):
-                    conditions.append("wr.waste_type = %s")
-                    params.append(filters['waste_type'])
-                
-                if filters.get('date_from'):
-                    conditions.append("wr.recorded_date >= %s")
-                    params.append(filters['date_from'])
-                
-                if filters.get('date_to'):
-                    conditions.append("wr.recorded_date <= %s")
-                    params.append(filters['date_to'])
-            
-            if conditions:
-                base_query += " WHERE " + " AND ".join(conditions)
-            
-            base_query += " ORDER BY wr.recorded_date DESC"
-            
-            return self.db.execute_query(base_query, tuple(params))
+            return attach_user_names(self.db, WASTE_RECORDS_QUERY.run(self.db, filters),
+                                     'responsible_person_id', 'responsible_person_name')
         except Exception as e:
             logger.error(f"Waste records retrieval error: {e}")
             return []
 
+# Columns of the single get_kpi_summary row, by dashboard group
+KPI_SUMMARY_COLUMNS = {
+    'production': ('total_batches', 'approved_batches', 'rejected_batches', 'total_production'),
+    'quality': ('total_tests', 'passed_tests', 'compliance_rate'),
+    'energy': ('total_consumption', 'avg_efficiency', 'total_cost'),
+    'waste': ('total_waste', 'avg_recycling_rate', 'total_valorization'),
+    'heat_recovery': ('total_heat_recovered', 'avg_thermal_efficiency', 'total_energy_savings')
+}
+
+# Chart series read from the daily materialized views created in init_database
+TREND_QUERIES = {
+    'energy_consumption': """
+        SELECT recorded_date as date, value, source
+        FROM mv_energy_daily
+        WHERE recorded_date BETWEEN %s AND %s
+        ORDER BY recorded_date
+    """,
+    'quality_rate': """
+        SELECT test_date as date, value
+        FROM mv_quality_daily
+        WHERE test_date BETWEEN %s AND %s
+        ORDER BY test_date
+    """,
+    'waste_generation': """
+        SELECT recorded_date as date, value, waste_type
+        FROM mv_waste_daily
+        WHERE recorded_date BETWEEN %s AND %s
+        ORDER BY recorded_date
+    """
+}
+# Refreshed out of band by refresh_trend_views.py (run it from cron); dashboard
+# requests only read them
+TREND_VIEWS = ('mv_energy_daily', 'mv_quality_daily', 'mv_waste_daily')
+
 class DashboardService:
     def __init__(self, db: DatabaseManager):
         self.db = db
@@ -379,111 +433,78 @@ class DashboardService:
             today = date.today()
             month_start = today.replace(day=1)
             
-            # Production KPIs
-            production_stats = self.db.execute_single("""
-                SELECT 
-                    COUNT(*) as total_batches,
-                    SUM(CASE WHEN status = 'approved' THEN 1 ELSE 0 END) as approved_batches,
-                    SUM(CASE WHEN status = 'rejected' THEN 1 ELSE 0 END) as rejected_batches,
-                    SUM(actual_quantity) as total_production
-                FROM production_batches 
-                WHERE production_date >= %s
-            """, (month_start,))
-            
-            # Quality KPIs
-            quality_stats = self.db.execute_single("""
-                SELECT 
-                    COUNT(*) as total_tests,
-                    SUM(CASE WHEN pass_fail = 'PASS' THEN 1 ELSE 0 END) as passed_tests,
-                    AVG(CASE WHEN iso_compliant THEN 1.0 ELSE 0.0 END) * 100 as compliance_rate
-                FROM quality_tests 
-                WHERE test_date >= %s
-            """, (month_start,))
-            
-            # Energy KPIs
-            energy_stats = self.db.execute_single("""
-                SELECT 
-                    SUM(consumption_kwh) as total_consumption,
-                    AVG(efficiency_percentage) as avg_efficiency,
-                    SUM(cost_amount) as total_cost
-                FROM energy_consumption 
-                WHERE recorded_date >= %s
-            """, (month_start,))
-            
-            # Waste KPIs
-            waste_stats = self.db.execute_single("""
-                SELECT 
-                    SUM(quantity_kg) as total_waste,
-                    AVG(recycling_percentage) as avg_recycling_rate,
-                    SUM(valorization_amount) as total_valorization
-                FROM waste_records 
-                WHERE recorded_date >= %s
-            """, (month_start,))
+            # All five KPI groups in one round trip: each CTE aggregates to a single
+            # row and the cross join puts them side by side
+            row = self.db.execute_single("""
+                WITH production AS (
+                    SELECT 
+                        COUNT(*) as total_batches,
+                        SUM(CASE WHEN status = 'approved' THEN 1 ELSE 0 END) as approved_batches,
+                        SUM(CASE WHEN status = 'rejected' THEN 1 ELSE 0 END) as rejected_batches,
+                        SUM(actual_quantity) as total_production
+                    FROM production_batches 
+                    WHERE production_date >= %(month_start)s
+                ), quality AS (
+                    SELECT 
+                        COUNT(*) as total_tests,
+                        SUM(CASE WHEN pass_fail = 'PASS' THEN 1 ELSE 0 END) as passed_tests,
+                        AVG(CASE WHEN iso_compliant THEN 1.0 ELSE 0.0 END) * 100 as compliance_rate
+                    FROM quality_tests 
+                    WHERE test_date >= %(month_start)s
+                ), energy AS (
+                    SELECT 
+                        SUM(consumption_kwh) as total_consumption,
+                        AVG(efficiency_percentage) as avg_efficiency,
+                        SUM(cost_amount) as total_cost
+                    FROM energy_consumption 
+                    WHERE recorded_date >= %(month_start)s
+                ), waste AS (
+                    SELECT 
+                        SUM(quantity_kg) as total_waste,
+                        AVG(recycling_percentage) as avg_recycling_rate,
+                        SUM(valorization_amount) as total_valorization
+                    FROM waste_records 
+                    WHERE recorded_date >= %(month_start)s
+                ), heat_recovery AS (
+                    SELECT 
+                        SUM(heat_recovered_kwh) as total_heat_recovered,
+                        AVG(thermal_efficiency_percentage) as avg_thermal_efficiency,
+                        SUM(energy_savings_kwh) as total_energy_savings
+                    FROM heat_recovery 
+                    WHERE recorded_date >= %(month_start)s
+                )
+                SELECT * FROM production, quality, energy, waste, heat_recovery
+            """, {'month_start': month_start})
             
-            # Heat Recovery KPIs
-            heat_recovery_stats = self.db.execute_single("""
-                SELECT 
-                    SUM(heat_recovered_kwh) as total_heat_recovered,
-                    AVG(thermal_efficiency_percentage) as avg_thermal_efficiency,
-                    SUM(energy_savings_kwh) as total_energy_savings
-                FROM heat_recovery 
-                WHERE recorded_date >= %s
-            """, (month_start,))
+            summary = {
+                group: {column: row[column] for column in columns}
+                for group, columns in KPI_SUMMARY_COLUMNS.items()
+            } if row else {group: {} for group in KPI_SUMMARY_COLUMNS}
             
             return {
-                'production': production_stats or {},
-                'quality': quality_stats or {},
-                'energy': energy_stats or {},
-                'waste': waste_stats or {},
-                'heat_recovery': heat_recovery_stats or {},
+                **summary,
                 'period': f"{month_start} to {today}"
             }
         except Exception as e:
             logger.error(f"KPI summary error: {e}")
             return {}
 
+    def refresh_trend_views(self):
+        """Recompute the daily trend materialized views without blocking readers"""
+        for view in TREND_VIEWS:
+            self.db.execute_query(f"REFRESH MATERIALIZED VIEW CONCURRENTLY {view}")
+
     def get_trend_data(self, metric: str, days: int = 30) -> List[Dict[str, Any]]:
         """Get trend data for charts"""
         try:
             end_date = date.today()
             start_date = end_date - timedelta(days=days)
             
-            if metric == 'energy_consumption':
-                return self.db.execute_query("""
-                    SELECT 
-                        recorded_date as date,
-                        SUM(consumption_kwh) as value,
-                        source
-                    FROM energy_consumption 
-                    WHERE recorded_date BETWEEN %s AND %s
-                    GROUP BY recorded_date, source
-                    ORDER BY recorded_date
-                """, (start_date, end_date))
+            query = TREND_QUERIES.get(metric)
+            if query is None:
+                return []
             
-            elif metric == 'quality_rate':
-                return self.db.execute_query("""
-                    SELECT 
-                        test_date as date,
-                        AVG(CASE WHEN pass_fail = 'PASS' THEN 1.0 ELSE 0.0 END) * 100 as value
-                    FROM quality_tests 
-                    WHERE test_date BETWEEN %s AND %s
-                    GROUP BY test_date
-                    ORDER BY test_date
-                """, (start_date, end_date))
-            
-            elif metric == 'waste_generation':
-                return self.db.execute_query("""
-                    SELECT 
-                        recorded_date as date,
-                        SUM(quantity_kg) as value,
-                        waste_type
-                    FROM waste_records 
-                    WHERE recorded_date BETWEEN %s AND %s
-                    GROUP BY recorded_date, waste_type
-                    ORDER BY recorded_date
-                """, (start_date, end_date))
-            
-            return []
+            return self.db.execute_query(query, (start_date, end_date))
         except Exception as e:
             logger.error(f"Trend data error: {e}")
             return []
\ No newline at end of file
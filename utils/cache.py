@@ -0,0 +1,123 @@
+"""
+Dersa EcoQuality - In-Process Caches
+Small TTL caches for slow-changing reference data
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from weakref import WeakKeyDictionary
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+# Users change rarely; list pages can live with names up to 5 minutes old
+USER_CACHE_TTL = 300
+
+# ISO standards are reference data; every quality test is checked against them
+ISO_STANDARDS_CACHE_TTL = 300
+
+class TTLCache:
+    """Hold a single value produced by a loader and reload it after ttl seconds"""
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._value = None
+        self._expires = 0.0
+        self._lock = threading.Lock()
+
+    def get(self, loader: Callable[[], Any]) -> Any:
+        """Return the cached value, calling loader() if it is missing or stale"""
+        if time.monotonic() >= self._expires:
+            with self._lock:
+                # Another thread may have refreshed it while we waited
+                if time.monotonic() >= self._expires:
+                    self._value = loader()
+                    self._expires = time.monotonic() + self.ttl
+        return self._value
+
+    def invalidate(self):
+        """Force the next get() to reload"""
+        with self._lock:
+            self._expires = 0.0
+
+class TTLDict:
+    """Bounded mapping whose entries expire ttl seconds after being stored"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items: 'OrderedDict[Hashable, Tuple[float, Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """Return the value stored under key, or default if it is missing or expired"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return default
+            if time.monotonic() >= item[0]:
+                del self._items[key]
+                return default
+            self._items.move_to_end(key)
+            return item[1]
+
+    def set(self, key: Hashable, value: Any):
+        """Store value under key, evicting the least recently used entry when full"""
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            if len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]):
+        """Drop every entry whose key matches predicate"""
+        with self._lock:
+            for key in [key for key in self._items if predicate(key)]:
+                del self._items[key]
+
+# Reference-data caches belong to one database: the SQLite app and the
+# PostgreSQL services can run in the same process
+_db_caches: 'WeakKeyDictionary[Any, Dict[str, TTLCache]]' = WeakKeyDictionary()
+_db_caches_lock = threading.Lock()
+
+def _db_cache(db, name: str, ttl: float) -> TTLCache:
+    """Return the named TTLCache of db, creating it on first use"""
+    with _db_caches_lock:
+        caches = _db_caches.setdefault(db, {})
+        if name not in caches:
+            caches[name] = TTLCache(ttl)
+        return caches[name]
+
+def get_user_names(db) -> Dict[int, Tuple[str, Optional[str]]]:
+    """Return {user_id: (username, full_name)} for every user"""
+    def load():
+        rows = db.execute_query("SELECT id, username, full_name FROM users")
+        return {row['id']: (row['username'], row['full_name']) for row in rows}
+    return _db_cache(db, 'user_names', USER_CACHE_TTL).get(load)
+
+def invalidate_user_names(db):
+    """Drop the cached user map of db after users are created or renamed"""
+    _db_cache(db, 'user_names', USER_CACHE_TTL).invalidate()
+
+def attach_user_names(db, records: List[Dict[str, Any]], id_field: str,
+                      name_field: str, username_field: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Add the full name (and optionally username) of the user referenced by
+    id_field to each record, in place of a LEFT JOIN on users
+    """
+    users = get_user_names(db)
+    for record in records:
+        username, full_name = users.get(record.get(id_field), (None, None))
+        record[name_field] = full_name
+        if username_field:
+            record[username_field] = username
+    return records
+
+def iso_standards_cache(db) -> TTLCache:
+    """Return the ISO standards cache of db, shared by the quality routes and QualityService"""
+    return _db_cache(db, 'iso_standards', ISO_STANDARDS_CACHE_TTL)
+
+def get_iso_standards(db, cache: Optional[TTLCache] = None) -> List[Dict[str, Any]]:
+    """Return the active ISO standards ordered by standard code"""
+    def load():
+        return db.execute_query("SELECT * FROM iso_standards WHERE is_active ORDER BY standard_code") or []
+    return (cache or iso_standards_cache(db)).get(load)
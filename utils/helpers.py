@@ -4,83 +4,163 @@ Common utility functions for the application
 """
 
 import os
+import time
+import hashlib
 import logging
+import tempfile
+import threading
+from types import MappingProxyType
+from functools import singledispatch
 from datetime import datetime, date
 from werkzeug.utils import secure_filename
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, Tuple, Callable, Iterable, List
 
 logger = logging.getLogger(__name__)
 
-def allowed_file(filename: str, allowed_extensions: set = {'png', 'jpg', 'jpeg', 'gif'}) -> bool:
+# Keyset pagination for list pages
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+
+# Uploads are streamed to disk in 1 MiB chunks; set UPLOAD_FSYNC=1 to flush
+# each file to disk before it is published under its final name
+UPLOAD_CHUNK_SIZE = 1 << 20
+UPLOAD_FSYNC = os.getenv('UPLOAD_FSYNC') == '1'
+# NamedTemporaryFile creates files as 0600; published uploads get the
+# umask-filtered 0644 that file.save() used to give them
+_umask = os.umask(0)
+os.umask(_umask)
+UPLOAD_FILE_MODE = 0o644 & ~_umask
+
+# Upload directories already created by this process
+_ensured_dirs = set()
+_ensured_dirs_lock = threading.Lock()
+
+def _ensure_dir(path: str):
+    """Create path once per process instead of on every upload"""
+    if path not in _ensured_dirs:
+        with _ensured_dirs_lock:
+            if path not in _ensured_dirs:
+                os.makedirs(path, exist_ok=True)
+                _ensured_dirs.add(path)
+
+# The current date only changes at midnight; re-read the clock at most once a minute
+TODAY_CACHE_SECONDS = 60
+_today_checked_at = 0.0
+_today_cache = (None, None, None)  # (date, ISO string, first day of month)
+
+def _today_values():
+    global _today_checked_at, _today_cache
+    now = time.monotonic()
+    if _today_cache[0] is None or now - _today_checked_at > TODAY_CACHE_SECONDS:
+        today = date.today()
+        _today_cache = (today, today.isoformat(), today.replace(day=1))
+        _today_checked_at = now
+    return _today_cache
+
+def today_iso() -> str:
+    """Return today's date as YYYY-MM-DD (cached for up to a minute)"""
+    return _today_values()[1]
+
+def current_month_start() -> date:
+    """Return the first day of the current month (cached for up to a minute)"""
+    return _today_values()[2]
+
+ALLOWED_IMAGE_EXTENSIONS = frozenset({'png', 'jpg', 'jpeg', 'gif'})
+
+def file_extension(filename: str) -> str:
+    """Return the lowercase extension of filename without the dot ('' if none)"""
+    return os.path.splitext(filename)[1][1:].lower()
+
+def allowed_file(filename: str, allowed_extensions: frozenset = ALLOWED_IMAGE_EXTENSIONS) -> bool:
     """Check if a file has an allowed extension"""
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in allowed_extensions
+    return file_extension(filename) in allowed_extensions
 
 def save_uploaded_file(file, upload_folder: str = 'uploads') -> Optional[str]:
     """
-    Save an uploaded file and return the relative path
+    Save an uploaded file under a name derived from its content and return
+    the relative path; identical uploads share one stored file
     Returns None if save fails
     """
     if not file or not file.filename:
         return None
-        
+    
+    temp_path = None
     try:
         filename = secure_filename(file.filename)
         
         # Create upload directory if it doesn't exist
         upload_dir = os.path.join('static', upload_folder)
-        os.makedirs(upload_dir, exist_ok=True)
+        _ensure_dir(upload_dir)
+        extension = file_extension(filename) or 'jpg'
         
-        # Generate unique filename with timestamp
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        file_extension = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'jpg'
-        new_filename = f"{timestamp}.{file_extension}"
+        # Hash while streaming to a temporary file next to the final one
+        digest = hashlib.blake2b(digest_size=16)
+        with tempfile.NamedTemporaryFile(dir=upload_dir, suffix='.part', delete=False) as out:
+            temp_path = out.name
+            while chunk := file.stream.read(UPLOAD_CHUNK_SIZE):
+                out.write(chunk)
+                digest.update(chunk)
+            if UPLOAD_FSYNC:
+                out.flush()
+                os.fsync(out.fileno())
         
+        new_filename = f"{digest.hexdigest()}.{extension}"
         file_path = os.path.join(upload_dir, new_filename)
-        file.save(file_path)
+        if os.path.exists(file_path):
+            # Same content already stored
+            os.remove(temp_path)
+        else:
+            os.chmod(temp_path, UPLOAD_FILE_MODE)
+            os.replace(temp_path, file_path)
         
         # Return relative path for database storage
         return f"{upload_folder}/{new_filename}"
         
     except Exception as e:
         logger.error(f"File upload error: {e}")
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
         return None
 
+# Display formatters dispatch on the value's type; singledispatch resolves
+# subclasses through the MRO and caches the result per type
+
+@singledispatch
 def format_date(date_obj) -> str:
     """Format date object for display"""
-    if isinstance(date_obj, str):
-        return date_obj
-    elif isinstance(date_obj, (date, datetime)):
-        return date_obj.strftime('%Y-%m-%d')
     return str(date_obj) if date_obj else ''
 
+@format_date.register
+def _(date_obj: str) -> str:
+    return date_obj
+
+@format_date.register
+def _(date_obj: date) -> str:
+    return date_obj.strftime('%Y-%m-%d')
+
+@singledispatch
 def format_datetime(datetime_obj) -> str:
     """Format datetime object for display"""
-    if isinstance(datetime_obj, str):
-        return datetime_obj
-    elif isinstance(datetime_obj, datetime):
-        return datetime_obj.strftime('%Y-%m-%d %H:%M:%S')
-    elif isinstance(datetime_obj, date):
-        return datetime_obj.strftime('%Y-%m-%d')
     return str(datetime_obj) if datetime_obj else ''
 
+@format_datetime.register
+def _(datetime_obj: str) -> str:
+    return datetime_obj
+
+@format_datetime.register
+def _(datetime_obj: date) -> str:
+    return datetime_obj.strftime('%Y-%m-%d')
+
+@format_datetime.register
+def _(datetime_obj: datetime) -> str:
+    return datetime_obj.strftime('%Y-%m-%d %H:%M:%S')
+
 def calculate_pass_rate(passed: int, total: int) -> float:
     """Calculate pass rate percentage"""
     if total == 0:
         return 0.0
     return (passed / total) * 100
 
-def validate_required_fields(data: Dict[str, Any], required_fields: list) -> list:
-    """
-    Validate that required fields are present and not empty
-    Returns list of missing field names
-    """
-    missing_fields = []
-    for field in required_fields:
-        value = data.get(field, '')
-        if not value or (isinstance(value, str) and not value.strip()):
-            missing_fields.append(field)
-    return missing_fields
-
 def safe_float_convert(value: Any, default: float = 0.0) -> float:
     """Safely convert value to float with fallback"""
     if value is None or value == '':
@@ -99,28 +179,116 @@ def safe_int_convert(value: Any, default: int = 0) -> int:
     except (ValueError, TypeError):
         return default
 
+# Form field converters: take a stripped, non-empty string and return the
+# typed value, or raise ValueError with the message to show the user
+
+def text_field(value: str) -> str:
+    return value
+
+def int_field(value: str) -> Optional[int]:
+    return safe_int_convert(value, None)
+
+def float_field(value: str) -> Optional[float]:
+    return safe_float_convert(value, None)
+
+def positive_int_field(message: str) -> Callable[[str], int]:
+    def convert(value: str) -> int:
+        number = safe_int_convert(value)
+        if number <= 0:
+            raise ValueError(message)
+        return number
+    return convert
+
+def positive_float_field(message: str) -> Callable[[str], float]:
+    def convert(value: str) -> float:
+        number = safe_float_convert(value)
+        if number <= 0:
+            raise ValueError(message)
+        return number
+    return convert
+
+def float_range_field(low: float, high: float, message: str) -> Callable[[str], float]:
+    def convert(value: str) -> float:
+        number = safe_float_convert(value)
+        if number < low or number > high:
+            raise ValueError(message)
+        return number
+    return convert
+
+def parse_form(form, schema: Dict[str, Callable[[str], Any]],
+               required: Iterable[str] = ()) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    Strip and convert every schema field of a submitted form in one pass
+    Empty fields become None. Returns (data, error messages); missing
+    required fields are reported instead of any conversion errors
+    """
+    data = {}
+    errors = []
+    empty = set()
+    for field, convert in schema.items():
+        value = (form.get(field) or '').strip()
+        if not value:
+            data[field] = None
+            empty.add(field)
+            continue
+        try:
+            data[field] = convert(value)
+        except ValueError as e:
+            data[field] = None
+            errors.append(str(e))
+    
+    missing = [field for field in required if field in empty]
+    if missing:
+        return data, [f'Required fields missing: {", ".join(missing)}']
+    return data, errors
+
+# CSS classes for status and priority badges, rendered once per table row
+STATUS_BADGE_CLASSES = MappingProxyType({
+    'planned': 'badge-secondary',
+    'in_production': 'badge-primary',
+    'quality_testing': 'badge-warning',
+    'approved': 'badge-success',
+    'rejected': 'badge-danger',
+    'shipped': 'badge-info',
+    'PASS': 'badge-success',
+    'FAIL': 'badge-danger',
+    'pending': 'badge-warning',
+    'completed': 'badge-success'
+})
+PRIORITY_BADGE_CLASSES = MappingProxyType({
+    'low': 'badge-success',
+    'medium': 'badge-warning',
+    'high': 'badge-danger',
+    'critical': 'badge-dark'
+})
+_status_badge_get = STATUS_BADGE_CLASSES.get
+_priority_badge_get = PRIORITY_BADGE_CLASSES.get
+
 def get_status_badge_class(status: str) -> str:
     """Return CSS class for status badges"""
-    status_classes = {
-        'planned': 'badge-secondary',
-        'in_production': 'badge-primary',
-        'quality_testing': 'badge-warning',
-        'approved': 'badge-success',
-        'rejected': 'badge-danger',
-        'shipped': 'badge-info',
-        'PASS': 'badge-success',
-        'FAIL': 'badge-danger',
-        'pending': 'badge-warning',
-        'completed': 'badge-success'
-    }
-    return status_classes.get(status, 'badge-secondary')
+    return _status_badge_get(status, 'badge-secondary')
 
 def get_priority_badge_class(priority: str) -> str:
     """Return CSS class for priority badges"""
-    priority_classes = {
-        'low': 'badge-success',
-        'medium': 'badge-warning',
-        'high': 'badge-danger',
-        'critical': 'badge-dark'
-    }
-    return priority_classes.get(priority, 'badge-secondary')
\ No newline at end of file
+    return _priority_badge_get(priority, 'badge-secondary')
+
+def parse_page_limit(value: Any) -> int:
+    """Return the requested page size, clamped to 1..MAX_PAGE_SIZE"""
+    limit = safe_int_convert(value, DEFAULT_PAGE_SIZE)
+    return min(max(limit, 1), MAX_PAGE_SIZE)
+
+def parse_page_cursor(cursor: Optional[str]) -> Optional[Tuple[str, int]]:
+    """
+    Parse a '<date>_<id>' keyset cursor from the query string
+    Returns None if the cursor is missing or malformed
+    """
+    if not cursor:
+        return None
+    date_part, _, id_part = cursor.rpartition('_')
+    if not date_part or not id_part.isdigit():
+        return None
+    return date_part, int(id_part)
+
+def make_page_cursor(record: Dict[str, Any], date_field: str) -> str:
+    """Build the keyset cursor pointing just past the given record"""
+    return f"{record[date_field]}_{record['id']}"
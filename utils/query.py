@@ -0,0 +1,43 @@
+"""
+Dersa EcoQuality - Query Builders
+SQL assembled once at import and reused for every request
+"""
+
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+class FilteredQuery:
+    """
+    A lister query whose WHERE clause depends on which optional filters are
+    set. Every variant is built once up front and picked by a bitmask of the
+    filters present, so requests never assemble SQL
+    Conditions carry the driver's own placeholders (? for SQLite, %s for
+    PostgreSQL); a condition with several placeholders takes a tuple value
+    """
+
+    def __init__(self, base: str, filters: List[Tuple[str, str]], order_by: str, tail: str = ''):
+        self.keys = [key for key, _ in filters]
+        self.queries = []
+        for mask in range(1 << len(filters)):
+            conditions = [condition for bit, (_, condition) in enumerate(filters) if mask & (1 << bit)]
+            query = base
+            if conditions:
+                query += " WHERE " + " AND ".join(conditions)
+            query += f" ORDER BY {order_by}"
+            if tail:
+                query += f" {tail}"
+            self.queries.append(query)
+
+    def run(self, db, filters: Optional[Dict[str, Any]], tail_params: Sequence[Any] = ()) -> List[Dict[str, Any]]:
+        """Execute the variant matching the non-empty filters; tail_params bind the tail (e.g. LIMIT)"""
+        mask = 0
+        params = []
+        for bit, key in enumerate(self.keys):
+            value = filters.get(key) if filters else None
+            if value:
+                mask |= 1 << bit
+                if isinstance(value, tuple):
+                    params.extend(value)
+                else:
+                    params.append(value)
+        params.extend(tail_params)
+        return db.execute_query(self.queries[mask], tuple(params))